@@ -1,14 +1,179 @@
 from __future__ import annotations
 
+import re
 import sqlite3
+import threading
 import time
 from contextlib import contextmanager
 from dataclasses import dataclass
+from itertools import islice, starmap
 from pathlib import Path
-from typing import Iterator
-
-
-@dataclass
+from typing import Iterable, Iterator
+
+from .privacy import compile_pattern
+
+_BULK_CHUNK_SIZE = 10_000
+_STATEMENT_CACHE_SIZE = 256
+_SCHEMA_VERSION = 1
+
+# Sentencias compartidas como constantes de módulo: el caché de sentencias de
+# sqlite3 se indexa por el texto SQL, así que reutilizar siempre el mismo objeto
+# evita volver a preparar la consulta en cada llamada.
+_SQL_INSERT_SESSION = """
+    INSERT INTO sessions (start_ts, end_ts, app, title, source)
+    VALUES (?, ?, ?, ?, ?)
+"""
+# Las filas llegan ya normalizadas por _bulk_session_params; SQLite sólo descarta
+# las de duración nula o negativa.
+_SQL_BULK_INSERT_SESSION = """
+    INSERT INTO sessions (start_ts, end_ts, app, title, source)
+    SELECT ?1, ?2, ?3, ?4, ?5
+    WHERE ?2 > ?1
+"""
+_SQL_RECENT_SESSIONS = """
+    SELECT id, start_ts, end_ts, app, title, source
+    FROM sessions
+    ORDER BY end_ts DESC
+    LIMIT ?
+"""
+# Paginación por clave (start_ts, id): cada página libera el lock de la conexión,
+# así un recorrido largo no bloquea al tracker.
+_SQL_SESSIONS_PAGE = """
+    SELECT id, start_ts, end_ts, app, title, source
+    FROM sessions
+    WHERE (start_ts, id) > (?, ?)
+    ORDER BY start_ts ASC, id ASC
+    LIMIT ?
+"""
+_SQL_MAX_SESSION_SPAN = "SELECT MAX(end_ts - start_ts) FROM sessions"
+# Una sesión que se solapa con [inicio, fin) empezó como muy pronto
+# `inicio - duración máxima`: acotar start_ts por ambos lados convierte el
+# escaneo abierto en un rango estrecho sobre idx_sessions_start_end.
+# El último parámetro descarta en SQLite las sesiones cuya parte dentro del rango es
+# más corta que la duración mínima pedida (0 = conservar todas).
+_SQL_OVERLAPPING_SESSIONS = """
+    SELECT id, start_ts, end_ts, app, title, source
+    FROM sessions
+    WHERE start_ts >= ?1 AND start_ts < ?2 AND end_ts > ?3
+        AND MIN(end_ts, ?2) - MAX(start_ts, ?3) >= ?4
+    ORDER BY start_ts ASC
+"""
+# Igual que _SQL_OVERLAPPING_SESSIONS pero ya recortado a [inicio, fin): devuelve tuplas
+# (app, title, source, start_ts, end_ts) listas para construir segmentos sin pasar por SessionRow.
+_SQL_CLIPPED_SESSIONS = """
+    SELECT
+        app,
+        title,
+        source,
+        MAX(start_ts, ?3),
+        MIN(end_ts, ?2),
+        has_title(title)
+    FROM sessions
+    WHERE start_ts >= ?1 AND start_ts < ?2 AND end_ts > ?3
+        AND MIN(end_ts, ?2) - MAX(start_ts, ?3) >= ?4
+    ORDER BY start_ts ASC
+"""
+# Misma ventana que _SQL_OVERLAPPING_SESSIONS, pero sumando en SQLite la parte de cada
+# sesión dentro del rango. Se agrupa sólo por lo que necesita la clasificación del
+# ranking; el ORDER BY conserva el orden de primera aparición para los empates.
+_SQL_OVERLAPPING_SESSION_TOTALS = """
+    SELECT
+        app,
+        has_title(title) AS has_title,
+        source,
+        MIN(end_ts, ?2) - MAX(start_ts, ?3) >= ?4 AS long_span,
+        SUM(MIN(end_ts, ?2) - MAX(start_ts, ?3)) AS seconds
+    FROM sessions
+    WHERE start_ts >= ?1 AND start_ts < ?2 AND end_ts > ?3
+        AND MIN(end_ts, ?2) - MAX(start_ts, ?3) >= ?5
+    GROUP BY app, has_title, source, long_span
+    ORDER BY MIN(start_ts) ASC
+"""
+_SQL_CLEAR_SESSIONS = "DELETE FROM sessions"
+_SQL_APP_CATEGORIES = """
+    SELECT app, category
+    FROM app_categories
+    ORDER BY app COLLATE NOCASE ASC
+"""
+_SQL_UPSERT_APP_CATEGORY = """
+    INSERT INTO app_categories (app, category, updated_ts)
+    VALUES (?, ?, ?)
+    ON CONFLICT(app) DO UPDATE SET
+        category=excluded.category,
+        updated_ts=excluded.updated_ts
+"""
+_SQL_DELETE_APP_CATEGORY = "DELETE FROM app_categories WHERE app = ?"
+_SQL_CLEAR_APP_CATEGORIES = "DELETE FROM app_categories"
+_SQL_LIST_PRIVACY_RULES = """
+    SELECT id, scope, match_mode, pattern, enabled, updated_ts
+    FROM privacy_rules
+    ORDER BY enabled DESC, updated_ts DESC, id DESC
+"""
+_SQL_LIST_ENABLED_PRIVACY_RULES = """
+    SELECT id, scope, match_mode, pattern, enabled, updated_ts
+    FROM privacy_rules
+    WHERE enabled = 1
+    ORDER BY updated_ts DESC, id DESC
+"""
+_SQL_UPSERT_PRIVACY_RULE = """
+    INSERT INTO privacy_rules (scope, match_mode, pattern, enabled, updated_ts)
+    VALUES (?, ?, ?, ?, ?)
+    ON CONFLICT(scope, match_mode, pattern) DO UPDATE SET
+        enabled=excluded.enabled,
+        updated_ts=excluded.updated_ts
+    RETURNING id, scope, match_mode, pattern, enabled, updated_ts
+"""
+_SQL_BULK_UPSERT_PRIVACY_RULE = """
+    INSERT INTO privacy_rules (scope, match_mode, pattern, enabled, updated_ts)
+    VALUES (?, ?, ?, ?, ?)
+    ON CONFLICT(scope, match_mode, pattern) DO UPDATE SET
+        enabled=excluded.enabled,
+        updated_ts=excluded.updated_ts
+"""
+_SQL_SET_PRIVACY_RULE_ENABLED = """
+    UPDATE privacy_rules
+    SET enabled = ?, updated_ts = ?
+    WHERE id = ?
+    RETURNING id, scope, match_mode, pattern, enabled, updated_ts
+"""
+_SQL_DELETE_PRIVACY_RULE = "DELETE FROM privacy_rules WHERE id = ?"
+_SQL_CLEAR_PRIVACY_RULES = "DELETE FROM privacy_rules"
+
+_UNKNOWN_APP_LABELS = frozenset({"desconocido", "Desconocido", "DESCONOCIDO"})
+
+_SESSION_COLUMNS = ("id", "start_ts", "end_ts", "app", "title", "source")
+
+# Directorios padre ya creados en este proceso: evita un stat/mkdir por instancia.
+_ENSURED_DIRS: set[str] = set()
+
+
+def _now_ts() -> int:
+    return time.time_ns() // 1_000_000_000
+
+
+def _normalize_app_label(app: str | None) -> str:
+    value = (app or "").strip()
+    if not value or value in _UNKNOWN_APP_LABELS:
+        return "Proceso"
+    if value.casefold() == "desconocido":
+        return "Proceso"
+    return value
+
+
+def _has_title(title: str | None) -> bool:
+    # Registrada como función SQL: el TRIM de SQLite sólo quita espacios ASCII y el
+    # segmento en vivo usa str.strip(), así ambos deciden igual con '\u3000' o '\xa0'.
+    return bool((title or "").strip())
+
+
+def _bulk_session_params(
+    rows: Iterable[tuple[int, int, str, str, str]],
+) -> Iterator[tuple[int, int, str, str, str]]:
+    for start_ts, end_ts, app, title, source in rows:
+        yield int(start_ts), int(end_ts), _normalize_app_label(app), str(title or ""), str(source or "")
+
+
+@dataclass(slots=True)
 class SessionRow:
     id: int
     start_ts: int
@@ -18,7 +183,7 @@ class SessionRow:
     source: str
 
 
-@dataclass
+@dataclass(slots=True)
 class PrivacyRuleRow:
     id: int
     scope: str
@@ -31,17 +196,69 @@ class PrivacyRuleRow:
 class ActivityDB:
     def __init__(self, db_path: str) -> None:
         self.db_path = db_path
-        Path(db_path).parent.mkdir(parents=True, exist_ok=True)
+        parent = str(Path(db_path).parent)
+        if parent not in _ENSURED_DIRS:
+            Path(parent).mkdir(parents=True, exist_ok=True)
+            _ENSURED_DIRS.add(parent)
+        self._lock = threading.Lock()
+        self._connection: sqlite3.Connection | None = None
+        # Las categorías cambian muy poco y se leen en cada overview: se cachean junto con la
+        # versión vigente, que cada escritura incrementa.
+        self._categories_version = 0
+        self._categories_cache: tuple[int, dict[str, str]] | None = None
+        self._sessions_version = 0
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(
+            self.db_path,
+            timeout=10,
+            check_same_thread=False,
+            cached_statements=_STATEMENT_CACHE_SIZE,
+        )
+        self._configure(conn)
+        return conn
 
     @contextmanager
     def _conn(self) -> Iterator[sqlite3.Connection]:
-        conn = sqlite3.connect(self.db_path, timeout=10)
-        conn.row_factory = sqlite3.Row
-        try:
-            yield conn
-            conn.commit()
-        finally:
-            conn.close()
+        # Conexión única y persistente compartida entre el tracker y la API.
+        with self._lock:
+            if self._connection is None:
+                self._connection = self._connect()
+            conn = self._connection
+            try:
+                yield conn
+                if conn.in_transaction:
+                    conn.commit()
+            except BaseException:
+                if conn.in_transaction:
+                    conn.rollback()
+                raise
+
+    def checkpoint(self) -> None:
+        with self._conn() as conn:
+            conn.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+
+    def close(self) -> None:
+        with self._lock:
+            if self._connection is not None:
+                self._connection.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+                self._connection.close()
+                self._connection = None
+
+    def _configure(self, conn: sqlite3.Connection) -> None:
+        conn.create_function("has_title", 1, _has_title, deterministic=True)
+        # La conexión es persistente, así que esto corre una vez por instancia (y tras cada
+        # reapertura): no se asume que el archivo siga en WAL si se borró y recreó.
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        # Umbral alto de autocheckpoint: el tracker hace el checkpoint periódico fuera de
+        # insert_session, pero si no corre (o falla) el WAL no crece sin límite.
+        conn.execute("PRAGMA wal_autocheckpoint=10000")
+        conn.execute("PRAGMA temp_store=MEMORY")
+        conn.execute("PRAGMA cache_size=-8000")
+        conn.execute("PRAGMA mmap_size=268435456")
+        conn.execute("PRAGMA busy_timeout=10000")
+        conn.execute("PRAGMA secure_delete=OFF")
 
     def init(self) -> None:
         with self._conn() as conn:
@@ -81,12 +298,36 @@ class ActivityDB:
                 """
             )
             conn.execute("CREATE INDEX IF NOT EXISTS idx_sessions_start_end ON sessions(start_ts, end_ts)")
+            # Sirve tanto el ORDER BY end_ts DESC de recent_sessions (recorrido inverso)
+            # como el predicado end_ts > ? de overlapping_sessions.
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_sessions_end_start ON sessions(end_ts, start_ts)")
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_sessions_span ON sessions(end_ts - start_ts)")
             conn.execute("CREATE INDEX IF NOT EXISTS idx_sessions_app ON sessions(app)")
             conn.execute("CREATE INDEX IF NOT EXISTS idx_app_categories_category ON app_categories(category)")
-            conn.execute("CREATE INDEX IF NOT EXISTS idx_privacy_rules_enabled ON privacy_rules(enabled)")
+            # Índice parcial: sólo las reglas activas, en el orden en que se aplican.
+            conn.execute("DROP INDEX IF EXISTS idx_privacy_rules_enabled")
+            conn.execute(
+                "CREATE INDEX IF NOT EXISTS idx_privacy_rules_enabled_updated "
+                "ON privacy_rules(updated_ts DESC, id DESC) WHERE enabled = 1"
+            )
             conn.execute(
                 "CREATE UNIQUE INDEX IF NOT EXISTS idx_privacy_rules_key ON privacy_rules(scope, match_mode, pattern)"
             )
+            self._migrate(conn)
+            conn.execute("ANALYZE")
+
+    def _migrate(self, conn: sqlite3.Connection) -> None:
+        version = int(conn.execute("PRAGMA user_version").fetchone()[0])
+        if version < 1:
+            # Normaliza etiquetas heredadas para que la lectura pueda confiar en el valor guardado.
+            # Se hace en Python con _normalize_app_label (TRIM/LOWER de SQLite sólo cubren ASCII)
+            # y por etiqueta distinta, que son pocas aunque haya muchas sesiones.
+            apps = [app for (app,) in conn.execute("SELECT DISTINCT app FROM sessions").fetchall()]
+            conn.executemany(
+                "UPDATE sessions SET app = ? WHERE app = ?",
+                [(normalized, app) for app in apps if (normalized := _normalize_app_label(app)) != app],
+            )
+        conn.execute(f"PRAGMA user_version = {_SCHEMA_VERSION}")
 
     def insert_session(
         self,
@@ -98,150 +339,158 @@ class ActivityDB:
     ) -> None:
         if end_ts <= start_ts:
             return
-        app = self._normalize_app_label(app)
+        app = _normalize_app_label(app)
         with self._conn() as conn:
-            conn.execute(
-                """
-                INSERT INTO sessions (start_ts, end_ts, app, title, source)
-                VALUES (?, ?, ?, ?, ?)
-                """,
-                (start_ts, end_ts, app, title, source),
-            )
+            conn.execute(_SQL_INSERT_SESSION, (start_ts, end_ts, app, title, source))
+        self._invalidate_sessions()
 
-    def bulk_insert_sessions(self, rows: list[tuple[int, int, str, str, str]]) -> int:
-        if not rows:
-            return 0
+    def bulk_insert_sessions(self, rows: Iterable[tuple[int, int, str, str, str]]) -> int:
+        # Acepta cualquier iterable: sólo hay en memoria un bloque de _BULK_CHUNK_SIZE filas a la vez.
+        pending = _bulk_session_params(rows)
+        with self._conn() as conn:
+            inserted_before = conn.total_changes
+            # Una sola transacción explícita: evita journaling por sentencia y, si la
+            # restauración falla a medias, _conn hace rollback sin dejar la tabla a medio llenar.
+            conn.execute("BEGIN IMMEDIATE")
+            while batch := list(islice(pending, _BULK_CHUNK_SIZE)):
+                conn.executemany(_SQL_BULK_INSERT_SESSION, batch)
+            conn.commit()
+            inserted = conn.total_changes - inserted_before
+        if inserted:
+            self._invalidate_sessions()
+        return inserted
 
-        normalized_rows: list[tuple[int, int, str, str, str]] = []
-        for start_ts, end_ts, app, title, source in rows:
-            if end_ts <= start_ts:
-                continue
-            normalized_rows.append(
-                (
-                    int(start_ts),
-                    int(end_ts),
-                    self._normalize_app_label(app),
-                    str(title or ""),
-                    str(source or ""),
-                )
-            )
+    def recent_sessions(self, limit: int = 100) -> list[SessionRow]:
+        with self._conn() as conn:
+            rows = conn.execute(_SQL_RECENT_SESSIONS, (max(1, min(limit, 5000)),)).fetchall()
 
-        if not normalized_rows:
-            return 0
+        return list(starmap(SessionRow, rows))
 
+    def recent_sessions_columns(self, limit: int = 100) -> dict[str, list]:
+        # Variante columnar para agregados: evita crear un SessionRow por fila.
         with self._conn() as conn:
-            conn.executemany(
-                """
-                INSERT INTO sessions (start_ts, end_ts, app, title, source)
-                VALUES (?, ?, ?, ?, ?)
-                """,
-                normalized_rows,
-            )
-        return len(normalized_rows)
+            rows = conn.execute(_SQL_RECENT_SESSIONS, (max(1, min(limit, 5000)),)).fetchall()
 
-    def recent_sessions(self, limit: int = 100) -> list[SessionRow]:
+        columns = zip(*rows) if rows else ((),) * len(_SESSION_COLUMNS)
+        return {name: list(values) for name, values in zip(_SESSION_COLUMNS, columns)}
+
+    def all_sessions(self) -> list[SessionRow]:
+        return list(self.iter_all_sessions())
+
+    def iter_all_sessions(self, batch_size: int = 1000) -> Iterator[SessionRow]:
+        last_start_ts, last_id = -(2**63), -(2**63)
+        page_size = max(1, batch_size)
+        while True:
+            with self._conn() as conn:
+                rows = conn.execute(_SQL_SESSIONS_PAGE, (last_start_ts, last_id, page_size)).fetchall()
+            yield from starmap(SessionRow, rows)
+            if len(rows) < page_size:
+                return
+            last_id, last_start_ts = rows[-1][0], rows[-1][1]
+
+    def overlapping_sessions(self, start_ts: int, end_ts: int, min_duration: int = 0) -> list[SessionRow]:
         with self._conn() as conn:
+            max_span = conn.execute(_SQL_MAX_SESSION_SPAN).fetchone()[0] or 0
             rows = conn.execute(
-                """
-                SELECT id, start_ts, end_ts, app, title, source
-                FROM sessions
-                ORDER BY end_ts DESC
-                LIMIT ?
-                """,
-                (max(1, min(limit, 5000)),),
+                _SQL_OVERLAPPING_SESSIONS, (start_ts - max_span, end_ts, start_ts, min_duration)
             ).fetchall()
 
-        return [self._map_session_row(row) for row in rows]
+        return list(starmap(SessionRow, rows))
 
-    def all_sessions(self) -> list[SessionRow]:
+    def clipped_sessions(
+        self, start_ts: int, end_ts: int, min_duration: int = 0
+    ) -> list[tuple[str, str, str, int, int, int]]:
+        # (app, title, source, inicio, fin, con título): el último se calcula al leer con _has_title.
         with self._conn() as conn:
-            rows = conn.execute(
-                """
-                SELECT id, start_ts, end_ts, app, title, source
-                FROM sessions
-                ORDER BY start_ts ASC
-                """
+            max_span = conn.execute(_SQL_MAX_SESSION_SPAN).fetchone()[0] or 0
+            return conn.execute(
+                _SQL_CLIPPED_SESSIONS, (start_ts - max_span, end_ts, start_ts, min_duration)
             ).fetchall()
-        return [self._map_session_row(row) for row in rows]
 
-    def overlapping_sessions(self, start_ts: int, end_ts: int) -> list[SessionRow]:
+    def overlapping_session_totals(
+        self, start_ts: int, end_ts: int, long_span_seconds: int = 0, min_duration: int = 0
+    ) -> list[tuple[str, int, str, int, int]]:
         with self._conn() as conn:
-            rows = conn.execute(
-                """
-                SELECT id, start_ts, end_ts, app, title, source
-                FROM sessions
-                WHERE end_ts > ? AND start_ts < ?
-                ORDER BY start_ts ASC
-                """,
-                (start_ts, end_ts),
+            max_span = conn.execute(_SQL_MAX_SESSION_SPAN).fetchone()[0] or 0
+            return conn.execute(
+                _SQL_OVERLAPPING_SESSION_TOTALS,
+                (start_ts - max_span, end_ts, start_ts, long_span_seconds, min_duration),
             ).fetchall()
 
-        return [self._map_session_row(row) for row in rows]
-
     def clear_sessions(self) -> int:
-        with self._conn() as conn:
-            cur = conn.execute("DELETE FROM sessions")
-        return int(cur.rowcount or 0)
+        # sessions es la única tabla grande: tras vaciarla compactamos WAL y archivo.
+        removed = self._clear_table(_SQL_CLEAR_SESSIONS, reclaim_space=True)
+        self._invalidate_sessions()
+        return removed
+
+    def revision(self) -> int:
+        # Cambia con cualquier escritura de sesiones o categorías (ambos contadores sólo crecen):
+        # sirve de clave para cachear resultados derivados de lo guardado.
+        return self._sessions_version + self._categories_version
+
+    def _invalidate_sessions(self) -> None:
+        with self._lock:
+            self._sessions_version += 1
 
     def get_app_categories(self) -> dict[str, str]:
+        cached = self._categories_cache
+        if cached is not None and cached[0] == self._categories_version:
+            return dict(cached[1])
+
         with self._conn() as conn:
-            rows = conn.execute(
-                """
-                SELECT app, category
-                FROM app_categories
-                ORDER BY app COLLATE NOCASE ASC
-                """
-            ).fetchall()
+            version = self._categories_version
+            rows = conn.execute(_SQL_APP_CATEGORIES).fetchall()
 
-        return {str(row["app"]): str(row["category"]) for row in rows}
+        mapping = {app: category for app, category in rows}
+        self._categories_cache = (version, mapping)
+        return dict(mapping)
 
     def set_app_category(self, app: str, category: str) -> tuple[str, str]:
-        app_norm = self._normalize_app_label(app)
+        app_norm = _normalize_app_label(app)
         category_norm = self._normalize_category_label(category)
-        now_ts = int(time.time())
+        now_ts = _now_ts()
         with self._conn() as conn:
-            conn.execute(
-                """
-                INSERT INTO app_categories (app, category, updated_ts)
-                VALUES (?, ?, ?)
-                ON CONFLICT(app) DO UPDATE SET
-                    category=excluded.category,
-                    updated_ts=excluded.updated_ts
-                """,
-                (app_norm, category_norm, now_ts),
-            )
+            conn.execute(_SQL_UPSERT_APP_CATEGORY, (app_norm, category_norm, now_ts))
+        self._invalidate_categories()
         return (app_norm, category_norm)
 
     def bulk_set_app_categories(self, entries: list[tuple[str, str]]) -> int:
-        saved = 0
-        for app, category in entries:
-            app_norm = (app or "").strip()
-            if not app_norm:
-                continue
-            self.set_app_category(app_norm, category)
-            saved += 1
-        return saved
+        now_ts = _now_ts()
+        rows = [
+            (_normalize_app_label(app), self._normalize_category_label(category), now_ts)
+            for app, category in entries
+            if (app or "").strip()
+        ]
+        if not rows:
+            return 0
+
+        with self._conn() as conn:
+            conn.executemany(_SQL_UPSERT_APP_CATEGORY, rows)
+        self._invalidate_categories()
+        return len(rows)
 
     def delete_app_category(self, app: str) -> bool:
-        app_norm = self._normalize_app_label(app)
+        app_norm = _normalize_app_label(app)
         with self._conn() as conn:
-            cur = conn.execute("DELETE FROM app_categories WHERE app = ?", (app_norm,))
+            cur = conn.execute(_SQL_DELETE_APP_CATEGORY, (app_norm,))
+        self._invalidate_categories()
         return bool(cur.rowcount)
 
     def clear_app_categories(self) -> int:
+        removed = self._clear_table(_SQL_CLEAR_APP_CATEGORIES)
+        self._invalidate_categories()
+        return removed
+
+    def _invalidate_categories(self) -> None:
+        # Tras el commit: una lectura concurrente que ya tomó la versión anterior no puede
+        # dejar en caché un resultado que parezca vigente.
+        with self._lock:
+            self._categories_version += 1
+
+    def list_privacy_rules(self, enabled_only: bool = False) -> list[PrivacyRuleRow]:
+        sql = _SQL_LIST_ENABLED_PRIVACY_RULES if enabled_only else _SQL_LIST_PRIVACY_RULES
         with self._conn() as conn:
-            cur = conn.execute("DELETE FROM app_categories")
-        return int(cur.rowcount or 0)
-
-    def list_privacy_rules(self) -> list[PrivacyRuleRow]:
-        with self._conn() as conn:
-            rows = conn.execute(
-                """
-                SELECT id, scope, match_mode, pattern, enabled, updated_ts
-                FROM privacy_rules
-                ORDER BY enabled DESC, updated_ts DESC, id DESC
-                """
-            ).fetchall()
+            rows = conn.execute(sql).fetchall()
         return [self._map_privacy_rule(row) for row in rows]
 
     def upsert_privacy_rule(
@@ -251,58 +500,56 @@ class ActivityDB:
         match_mode: str,
         enabled: bool = True,
     ) -> PrivacyRuleRow:
-        scope_norm = self._normalize_rule_scope(scope)
-        mode_norm = self._normalize_match_mode(match_mode)
-        pattern_norm = self._normalize_rule_pattern(pattern)
-        now_ts = int(time.time())
+        scope_norm, mode_norm, pattern_norm = self._normalize_privacy_rule(scope, pattern, match_mode)
+        now_ts = _now_ts()
         enabled_int = 1 if enabled else 0
 
         with self._conn() as conn:
-            conn.execute(
-                """
-                INSERT INTO privacy_rules (scope, match_mode, pattern, enabled, updated_ts)
-                VALUES (?, ?, ?, ?, ?)
-                ON CONFLICT(scope, match_mode, pattern) DO UPDATE SET
-                    enabled=excluded.enabled,
-                    updated_ts=excluded.updated_ts
-                """,
-                (scope_norm, mode_norm, pattern_norm, enabled_int, now_ts),
-            )
             row = conn.execute(
-                """
-                SELECT id, scope, match_mode, pattern, enabled, updated_ts
-                FROM privacy_rules
-                WHERE scope = ? AND match_mode = ? AND pattern = ?
-                LIMIT 1
-                """,
-                (scope_norm, mode_norm, pattern_norm),
+                _SQL_UPSERT_PRIVACY_RULE,
+                (scope_norm, mode_norm, pattern_norm, enabled_int, now_ts),
             ).fetchone()
 
         if row is None:
             raise RuntimeError("No se pudo guardar la regla de privacidad")
         return self._map_privacy_rule(row)
 
+    def bulk_upsert_privacy_rules(self, entries: list[tuple[str, str, str, bool]]) -> tuple[int, int]:
+        # entries: (scope, match_mode, pattern, enabled). Las reglas inválidas se omiten y se
+        # cuentan; las válidas se guardan todas en una sola transacción.
+        now_ts = _now_ts()
+        rows: list[tuple[str, str, str, int, int]] = []
+        skipped = 0
+        for scope, match_mode, pattern, enabled in entries:
+            try:
+                scope_norm, mode_norm, pattern_norm = self._normalize_privacy_rule(scope, pattern, match_mode)
+            except ValueError:
+                skipped += 1
+                continue
+            rows.append((scope_norm, mode_norm, pattern_norm, 1 if enabled else 0, now_ts))
+
+        if rows:
+            with self._conn() as conn:
+                conn.executemany(_SQL_BULK_UPSERT_PRIVACY_RULE, rows)
+        return len(rows), skipped
+
+    def _normalize_privacy_rule(self, scope: str, pattern: str, match_mode: str) -> tuple[str, str, str]:
+        scope_norm = self._normalize_rule_scope(scope)
+        mode_norm = self._normalize_match_mode(match_mode)
+        pattern_norm = self._normalize_rule_pattern(pattern)
+        if mode_norm == "regex":
+            # Valida y deja la regex compilada en caché para el filtro de privacidad.
+            try:
+                compile_pattern(pattern_norm)
+            except re.error as exc:
+                raise ValueError(f"pattern no es una regex válida: {exc}") from exc
+        return scope_norm, mode_norm, pattern_norm
+
     def set_privacy_rule_enabled(self, rule_id: int, enabled: bool) -> PrivacyRuleRow | None:
-        now_ts = int(time.time())
+        now_ts = _now_ts()
         enabled_int = 1 if enabled else 0
         with self._conn() as conn:
-            conn.execute(
-                """
-                UPDATE privacy_rules
-                SET enabled = ?, updated_ts = ?
-                WHERE id = ?
-                """,
-                (enabled_int, now_ts, int(rule_id)),
-            )
-            row = conn.execute(
-                """
-                SELECT id, scope, match_mode, pattern, enabled, updated_ts
-                FROM privacy_rules
-                WHERE id = ?
-                LIMIT 1
-                """,
-                (int(rule_id),),
-            ).fetchone()
+            row = conn.execute(_SQL_SET_PRIVACY_RULE_ENABLED, (enabled_int, now_ts, int(rule_id))).fetchone()
 
         if row is None:
             return None
@@ -310,42 +557,47 @@ class ActivityDB:
 
     def delete_privacy_rule(self, rule_id: int) -> bool:
         with self._conn() as conn:
-            cur = conn.execute("DELETE FROM privacy_rules WHERE id = ?", (int(rule_id),))
+            cur = conn.execute(_SQL_DELETE_PRIVACY_RULE, (int(rule_id),))
         return bool(cur.rowcount)
 
     def clear_privacy_rules(self) -> int:
+        return self._clear_table(_SQL_CLEAR_PRIVACY_RULES)
+
+    def _clear_table(self, delete_sql: str, reclaim_space: bool = False) -> int:
+        # DELETE sin WHERE ni triggers activa la "truncate optimization" de SQLite.
         with self._conn() as conn:
-            cur = conn.execute("DELETE FROM privacy_rules")
+            conn.execute("BEGIN IMMEDIATE")
+            cur = conn.execute(delete_sql)
+            conn.commit()
+        if reclaim_space:
+            self._reclaim_space()
         return int(cur.rowcount or 0)
 
-    def _map_session_row(self, row: sqlite3.Row) -> SessionRow:
-        return SessionRow(
-            id=int(row["id"]),
-            start_ts=int(row["start_ts"]),
-            end_ts=int(row["end_ts"]),
-            app=self._normalize_app_label(row["app"]),
-            title=str(row["title"] or ""),
-            source=str(row["source"] or ""),
-        )
-
-    def _map_privacy_rule(self, row: sqlite3.Row) -> PrivacyRuleRow:
+    def _reclaim_space(self) -> None:
+        # VACUUM reescribe todo el archivo: se hace en una conexión aparte y fuera del lock
+        # para no bloquear al tracker ni a la API mientras dura.
+        try:
+            conn = sqlite3.connect(self.db_path, timeout=10)
+            try:
+                conn.execute("VACUUM")
+                conn.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+            finally:
+                conn.close()
+        except sqlite3.Error:
+            # El borrado ya quedó confirmado; compactar es opcional y puede esperar al próximo.
+            pass
+
+    def _map_privacy_rule(self, row: tuple) -> PrivacyRuleRow:
+        rule_id, scope, match_mode, pattern, enabled, updated_ts = row
         return PrivacyRuleRow(
-            id=int(row["id"]),
-            scope=str(row["scope"]),
-            match_mode=str(row["match_mode"]),
-            pattern=str(row["pattern"]),
-            enabled=bool(int(row["enabled"])),
-            updated_ts=int(row["updated_ts"]),
+            id=rule_id,
+            scope=scope,
+            match_mode=match_mode,
+            pattern=pattern,
+            enabled=bool(enabled),
+            updated_ts=updated_ts,
         )
 
-    def _normalize_app_label(self, app: str | None) -> str:
-        value = (app or "").strip()
-        if not value:
-            return "Proceso"
-        if value.casefold() == "desconocido":
-            return "Proceso"
-        return value
-
     def _normalize_category_label(self, category: str | None) -> str:
         value = (category or "").strip()
         if not value:
@@ -4,13 +4,121 @@ import json
 import os
 import re
 import shutil
+import socket
 import subprocess
 import time
+from concurrent.futures import ThreadPoolExecutor
 from dataclasses import dataclass
-from typing import Literal
+from functools import lru_cache
+from types import MappingProxyType
+from typing import Callable, Literal
 
 import psutil
 
+from .sessionbus import SessionBus
+
+# El tipo de sesión y el compositor casi nunca cambian en caliente: evitamos recorrer /proc en cada tick.
+_SYSTEM_PROBE_TTL_SECONDS = 5.0
+
+_WAYLAND_COMPOSITORS = frozenset({"kwin_wayland", "gnome-shell", "hyprland", "sway"})
+_X11_SERVERS = frozenset({"xorg"})
+_KWIN_PROCESSES = frozenset({"kwin_wayland", "kwin_x11"})
+
+_UID = os.getuid()
+_MAX_OUTPUT_BYTES = 64 * 1024
+_LIST_WORKERS = min(32, (os.cpu_count() or 1) * 4)
+
+_PID_RE = re.compile(r"(\d+)")
+_SEPARATORS_RE = re.compile(r"[-_]+")
+_VARIANT_ENTRY_RE = re.compile(r"'([^']+)'\s*:\s*<(?:'((?:\\'|[^'])*)'|(-?\d+))>")
+
+_APP_ALIASES = MappingProxyType(
+    {
+        "org.kde.konsole": "Konsole",
+        "org.kde.dolphin": "Dolphin",
+        "org.telegram.desktop": "Telegram",
+        "brave-browser": "Brave",
+        "brave": "Brave",
+        "chrome": "Chrome",
+        "google-chrome": "Chrome",
+        "chromium": "Chromium",
+        "chromium-browser": "Chromium",
+        "firefox": "Firefox",
+        "firefox-bin": "Firefox",
+        "code": "VS Code",
+        "code-oss": "VS Code",
+        "cursor": "Cursor",
+        "dev.aunetx.deezer": "Deezer",
+        "deezer-desktop": "Deezer",
+        "deezer": "Deezer",
+        "spotify": "Spotify",
+        "antigravity": "Antigravity",
+        "obsidian": "Obsidian",
+        "libreoffice": "LibreOffice",
+        "discord": "Discord",
+        "slack": "Slack",
+        "teams": "Teams",
+        "telegram": "Telegram",
+        "konsole": "Konsole",
+        "kitty": "Kitty",
+        "alacritty": "Alacritty",
+    }
+)
+_UPPER_TOKENS = MappingProxyType({"vscode": "VS Code", "api": "API", "ui": "UI", "db": "DB", "pdf": "PDF"})
+
+
+def _has_wayland_socket() -> bool:
+    # run.sh exporta DISPLAY incluso en KDE Wayland, así que DISPLAY solo no basta para decidir.
+    runtime_dir = os.getenv("XDG_RUNTIME_DIR") or f"/run/user/{_UID}"
+    try:
+        with os.scandir(runtime_dir) as entries:
+            return any(entry.name.startswith("wayland-") and not entry.name.endswith(".lock") for entry in entries)
+    except OSError:
+        return False
+
+
+def _hyprland_socket_path() -> str | None:
+    signature = os.getenv("HYPRLAND_INSTANCE_SIGNATURE", "").strip()
+    if not signature:
+        return None
+    runtime_dir = os.getenv("XDG_RUNTIME_DIR") or f"/run/user/{_UID}"
+    # Hyprland >= 0.40 usa XDG_RUNTIME_DIR; versiones previas, /tmp/hypr.
+    for base in (f"{runtime_dir}/hypr", "/tmp/hypr"):
+        path = f"{base}/{signature}/.socket.sock"
+        if os.path.exists(path):
+            return path
+    return None
+
+
+@lru_cache(maxsize=None)
+def _which(name: str) -> str | None:
+    return shutil.which(name)
+
+
+def _any_process_named(names: frozenset[str]) -> bool:
+    # Sólo leemos /proc/<pid>/comm (una lectura corta) y cortamos en la primera coincidencia.
+    try:
+        entries = os.scandir("/proc")
+    except OSError:
+        return False
+    with entries:
+        for entry in entries:
+            if not entry.name.isdigit():
+                continue
+            try:
+                fd = os.open(f"/proc/{entry.name}/comm", os.O_RDONLY)
+            except OSError:
+                continue
+            try:
+                comm = os.read(fd, 64)
+            except OSError:
+                continue
+            finally:
+                os.close(fd)
+            if comm.decode("utf-8", "replace").strip().lower() in names:
+                return True
+    return False
+
 
 @dataclass
 class ActiveWindow:
@@ -24,21 +132,49 @@ class ActiveWindow:
 class WindowDetector:
     """Detecta la ventana activa con varios métodos por orden de prioridad."""
 
-    def __init__(self) -> None:
-        self._has_xdotool = shutil.which("xdotool") is not None
-        self._has_kdotool = shutil.which("kdotool") is not None
-        self._has_xprop = shutil.which("xprop") is not None
-        self._has_hyprctl = shutil.which("hyprctl") is not None
-        self._has_gdbus = shutil.which("gdbus") is not None
+    def __init__(self, bus: SessionBus | None = None) -> None:
         self._enable_kwin_dbus = os.getenv("ACTIVIDAD_ENABLE_KWIN_DBUS", "").strip().lower() in {
             "1",
             "true",
             "yes",
             "on",
         }
+        self._bus = bus if bus is not None else SessionBus()
+        self._detect_cache: tuple[float, ActiveWindow | None] | None = None
+        self._list_cache: tuple[float, int, list[ActiveWindow]] | None = None
+        self._load_capabilities()
+
+    def _load_capabilities(self) -> None:
+        self._has_xdotool = _which("xdotool") is not None
+        self._has_kdotool = _which("kdotool") is not None
+        self._has_xprop = _which("xprop") is not None
+        self._has_hyprctl = _which("hyprctl") is not None
+        self._has_gdbus = _which("gdbus") is not None
+        self._hypr_socket_path = _hyprland_socket_path()
+        self._has_hyprland = self._has_hyprctl or self._hypr_socket_path is not None
         self._kwin_probe_cache: tuple[float, bool] | None = None
+        self._dbus_env: dict[str, str] | None = None
+        self._session_cache: tuple[float, Literal["wayland", "x11", "unknown"]] | None = None
+        self._kwin_running_cache: tuple[float, bool] | None = None
+        # Cadena de backends por tipo de sesión, resuelta una vez en vez de recorrer el if/elif en cada tick.
+        self._detect_chains: dict[str, tuple[Callable[[], ActiveWindow | None], ...]] = {}
+
+    def refresh_capabilities(self) -> None:
+        # Para cambios raros (herramienta instalada, cambio de sesión): se recalcula todo lo cacheado.
+        _which.cache_clear()
+        self._load_capabilities()
+        self.invalidate()
 
     def _session_type(self) -> Literal["wayland", "x11", "unknown"]:
+        now = time.monotonic()
+        if self._session_cache and (now - self._session_cache[0]) < _SYSTEM_PROBE_TTL_SECONDS:
+            return self._session_cache[1]
+
+        session_type = self._probe_session_type()
+        self._session_cache = (now, session_type)
+        return session_type
+
+    def _probe_session_type(self) -> Literal["wayland", "x11", "unknown"]:
         raw = os.getenv("XDG_SESSION_TYPE", "").strip().lower()
         if raw in {"wayland", "x11"}:
             return raw
@@ -48,19 +184,17 @@ class WindowDetector:
         if wayland_display:
             return "wayland"
 
-        # Fallback por procesos cuando no tenemos entorno de sesión confiable.
-        names = set()
-        for proc in psutil.process_iter(attrs=["name"]):
-            name = (proc.info.get("name") or "").lower()
-            if name:
-                names.add(name)
+        if x_display and not _has_wayland_socket():
+            # DISPLAY sin ningún socket wayland-* del usuario: X11 sin recorrer /proc.
+            return "x11"
 
-        if {"kwin_wayland", "gnome-shell", "hyprland", "sway"} & names:
+        # Fallback por procesos cuando no tenemos entorno de sesión confiable.
+        if _any_process_named(_WAYLAND_COMPOSITORS):
             return "wayland"
         if x_display and not wayland_display:
             # En algunas configuraciones X11, XDG_SESSION_TYPE llega vacío.
             return "x11"
-        if "xorg" in names:
+        if _any_process_named(_X11_SERVERS):
             return "x11"
         return "unknown"
 
@@ -69,12 +203,12 @@ class WindowDetector:
         can_x11 = self._has_xdotool and self._has_xprop
         can_kdotool = self._has_kdotool
         can_kwin = self._enable_kwin_dbus and self._can_use_kwin_dbus()
-        can_wayland = self._has_hyprctl or can_kdotool or can_kwin
+        can_wayland = self._has_hyprland or can_kdotool or can_kwin
         preferred_backend = "none"
         if session_type == "x11":
             preferred_backend = "x11" if can_x11 else "none"
         elif session_type == "wayland":
-            if self._has_hyprctl:
+            if self._has_hyprland:
                 preferred_backend = "hyprctl"
             elif can_kdotool:
                 preferred_backend = "kdotool"
@@ -83,7 +217,7 @@ class WindowDetector:
             elif can_x11:
                 preferred_backend = "x11_fallback"
         else:
-            if self._has_hyprctl:
+            if self._has_hyprland:
                 preferred_backend = "hyprctl"
             elif can_kdotool:
                 preferred_backend = "kdotool"
@@ -97,7 +231,9 @@ class WindowDetector:
             "kdotool": self._has_kdotool,
             "xprop": self._has_xprop,
             "hyprctl": self._has_hyprctl,
+            "hyprland_socket": self._hypr_socket_path is not None,
             "gdbus": self._has_gdbus,
+            "dbus_native": self._bus.available,
             "kwin_dbus_enabled": self._enable_kwin_dbus,
             "kwin_dbus": can_kwin,
             "session_type": session_type,
@@ -107,73 +243,95 @@ class WindowDetector:
             "preferred_backend": preferred_backend,
         }
 
-    def detect(self) -> ActiveWindow | None:
-        session_type = self._session_type()
+    def detect(self, ttl: float = 0.25) -> ActiveWindow | None:
+        # Llamadas casi simultáneas (tracker + UI) comparten el mismo resultado.
+        now = time.monotonic()
+        cached = self._detect_cache
+        if cached is not None and (now - cached[0]) < ttl:
+            return cached[1]
 
-        if session_type == "x11":
-            return self._detect_x11_first()
-        if session_type == "wayland":
-            return self._detect_wayland_first()
+        detected = self._detect_uncached()
+        self._detect_cache = (time.monotonic(), detected)
+        return detected
 
-        # Entorno desconocido: probamos ambas rutas.
-        return self._detect_wayland_first() or self._detect_x11_first()
+    def invalidate(self) -> None:
+        self._detect_cache = None
+        self._list_cache = None
 
-    def list_windows(self, limit: int = 300) -> list[ActiveWindow]:
-        max_items = max(1, min(limit, 2000))
-        if self._has_kdotool:
-            return self._list_kdotool_windows(limit=max_items)
-        if self._has_xdotool and self._has_xprop:
-            return self._list_x11_windows(limit=max_items)
-        return []
+    def _detect_uncached(self, session_type: Literal["wayland", "x11", "unknown"] | None = None) -> ActiveWindow | None:
+        if session_type is None:
+            session_type = self._session_type()
 
-    def _detect_x11_first(self) -> ActiveWindow | None:
-        if self._has_xdotool and self._has_xprop:
-            detected = self._detect_x11()
-            if detected is not None:
-                return detected
-        if self._has_hyprctl:
-            detected = self._detect_hyprland()
+        for detect in self._detect_chain(session_type):
+            detected = detect()
             if detected is not None:
                 return detected
         return None
 
-    def _detect_wayland_first(self) -> ActiveWindow | None:
-        if self._has_hyprctl:
-            detected = self._detect_hyprland()
-            if detected is not None:
-                return detected
+    def _detect_chain(self, session_type: str) -> tuple[Callable[[], ActiveWindow | None], ...]:
+        chain = self._detect_chains.get(session_type)
+        if chain is None:
+            chain = self._build_detect_chain(session_type)
+            self._detect_chains[session_type] = chain
+        return chain
+
+    def _build_detect_chain(self, session_type: str) -> tuple[Callable[[], ActiveWindow | None], ...]:
+        can_x11 = self._has_xdotool and self._has_xprop
+        if session_type == "x11":
+            steps = [
+                (can_x11, self._detect_x11),
+                (self._has_hyprland, self._detect_hyprland),
+            ]
+        else:
+            # Wayland o entorno desconocido: X11 al final, útil cuando la app activa corre sobre XWayland.
+            steps = [
+                (self._has_hyprland, self._detect_hyprland),
+                (self._has_kdotool, self._detect_kdotool),
+                (self._enable_kwin_dbus, self._detect_kwin_dbus_if_available),
+                (can_x11, self._detect_x11),
+            ]
+        return tuple(detect for enabled, detect in steps if enabled)
+
+    def list_windows(self, limit: int = 300, ttl: float = 2.0) -> list[ActiveWindow]:
+        # Listar ventanas lanza un proceso por ventana: peticiones seguidas reutilizan el último
+        # listado si pidió al menos tantas ventanas.
+        max_items = max(1, min(limit, 2000))
+        now = time.monotonic()
+        cached = self._list_cache
+        if cached is not None and (now - cached[0]) < ttl and cached[1] >= max_items:
+            return cached[2][:max_items]
+
+        windows = self._list_windows_uncached(max_items)
+        self._list_cache = (time.monotonic(), max_items, windows)
+        return list(windows)
+
+    def _list_windows_uncached(self, max_items: int) -> list[ActiveWindow]:
         if self._has_kdotool:
-            detected = self._detect_kdotool()
-            if detected is not None:
-                return detected
-        if self._enable_kwin_dbus and self._can_use_kwin_dbus():
-            detected = self._detect_kwin_dbus()
-            if detected is not None:
-                return detected
+            return self._list_kdotool_windows(limit=max_items)
         if self._has_xdotool and self._has_xprop:
-            # Fallback útil cuando la app activa corre sobre XWayland.
-            detected = self._detect_x11()
-            if detected is not None:
-                return detected
-        return None
+            return self._list_x11_windows(limit=max_items)
+        return []
 
     def _run(self, args: list[str], timeout: float = 1.5) -> str | None:
         env = None
         if args and args[0] in {"gdbus", "kdotool"}:
-            env = os.environ.copy()
-            runtime_dir = env.get("XDG_RUNTIME_DIR") or f"/run/user/{os.getuid()}"
-            bus_path = f"{runtime_dir}/bus"
-            if "XDG_RUNTIME_DIR" not in env and os.path.exists(runtime_dir):
-                env["XDG_RUNTIME_DIR"] = runtime_dir
-            if not env.get("DBUS_SESSION_BUS_ADDRESS") and os.path.exists(bus_path):
-                env["DBUS_SESSION_BUS_ADDRESS"] = f"unix:path={bus_path}"
+            env = self._session_env()
+
+        # Ruta absoluta + close_fds=False permiten a subprocess usar posix_spawn (vfork) en vez de
+        # fork+exec; los descriptores de Python ya son no heredables, así que no se filtra nada.
+        executable = _which(args[0])
+        if executable is None:
+            return None
 
         try:
             out = subprocess.run(
                 args,
+                executable=executable,
+                close_fds=False,
                 check=False,
-                capture_output=True,
-                text=True,
+                stdin=subprocess.DEVNULL,
+                stdout=subprocess.PIPE,
+                stderr=subprocess.DEVNULL,
                 timeout=timeout,
                 env=env,
             )
@@ -182,10 +340,26 @@ class WindowDetector:
 
         if out.returncode != 0:
             return None
-        return out.stdout.strip()
+        # Acotamos la salida: un título patológico no debe arrastrar megas por el parseo.
+        return out.stdout[:_MAX_OUTPUT_BYTES].decode("utf-8", "replace").strip()
+
+    def _session_env(self) -> dict[str, str]:
+        # Se construye una vez: copiar os.environ en cada llamada a gdbus/kdotool no aporta nada.
+        if self._dbus_env is None:
+            env = os.environ.copy()
+            runtime_dir = env.get("XDG_RUNTIME_DIR") or f"/run/user/{_UID}"
+            bus_path = f"{runtime_dir}/bus"
+            if "XDG_RUNTIME_DIR" not in env and os.path.exists(runtime_dir):
+                env["XDG_RUNTIME_DIR"] = runtime_dir
+            if not env.get("DBUS_SESSION_BUS_ADDRESS") and os.path.exists(bus_path):
+                env["DBUS_SESSION_BUS_ADDRESS"] = f"unix:path={bus_path}"
+            self._dbus_env = env
+        return self._dbus_env
 
     def _detect_hyprland(self) -> ActiveWindow | None:
-        raw = self._run(["hyprctl", "activewindow", "-j"])
+        raw = self._hyprland_request("j/activewindow")
+        if raw is None and self._has_hyprctl:
+            raw = self._run(["hyprctl", "activewindow", "-j"])
         if not raw:
             return None
 
@@ -201,18 +375,60 @@ class WindowDetector:
 
         return ActiveWindow(app=app, title=title, source="hyprctl", pid=pid)
 
+    def _hyprland_request(self, command: str) -> str | None:
+        # Hablamos con el socket IPC de Hyprland igual que hyprctl, sin lanzar un proceso.
+        path = self._hypr_socket_path or _hyprland_socket_path()
+        if path is None:
+            return None
+        self._hypr_socket_path = path
+        chunks: list[bytes] = []
+        try:
+            with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+                sock.settimeout(1.0)
+                sock.connect(path)
+                sock.sendall(command.encode("utf-8"))
+                while True:
+                    chunk = sock.recv(65536)
+                    if not chunk:
+                        break
+                    chunks.append(chunk)
+        except OSError:
+            # Socket desaparecido (Hyprland reiniciado): se vuelve a resolver en la próxima llamada.
+            self._hypr_socket_path = None
+            return None
+        return b"".join(chunks).decode("utf-8", "replace").strip()
+
     def _detect_kdotool(self) -> ActiveWindow | None:
         window_id = self._run(["kdotool", "getactivewindow"])
         if not window_id:
             return None
+        return self._kdotool_window(window_id)
 
+    def _kdotool_window(self, window_id: str) -> ActiveWindow:
         title = self._run(["kdotool", "getwindowname", window_id]) or ""
         app = self._run(["kdotool", "getwindowclassname", window_id]) or ""
         pid = self._coerce_int(self._run(["kdotool", "getwindowpid", window_id]) or "")
         app = self._resolve_app_name(app=app, pid=pid, title=title)
         return ActiveWindow(app=app, title=title, source="kdotool", pid=pid, window_id=window_id)
 
+    def _detect_kwin_dbus_if_available(self) -> ActiveWindow | None:
+        if not self._can_use_kwin_dbus():
+            return None
+        return self._detect_kwin_dbus()
+
     def _detect_kwin_dbus(self) -> ActiveWindow | None:
+        if self._bus.available:
+            reply = self._bus.call("org.kde.KWin", "/KWin", "org.kde.KWin", "queryWindowInfo", timeout=2.0)
+            if not reply:
+                return None
+            # a{sv}: jeepney entrega cada valor como (firma, valor).
+            info = {key: value for key, (_, value) in reply[0].items()}
+            title = str(info.get("caption") or "").strip()
+            app = str(info.get("resourceClass") or info.get("desktopFile") or info.get("resourceName") or "").strip()
+            pid = self._coerce_int(info.get("pid"))
+            app = self._resolve_app_name(app=app, pid=pid, title=title)
+            return ActiveWindow(app=app, title=title, source="kwin_dbus", pid=pid)
+
         raw = self._run(
             [
                 "gdbus",
@@ -230,13 +446,10 @@ class WindowDetector:
         if not raw:
             return None
 
-        title = self._extract_variant_map_value(raw, "caption")
-        app = (
-            self._extract_variant_map_value(raw, "resourceClass")
-            or self._extract_variant_map_value(raw, "desktopFile")
-            or self._extract_variant_map_value(raw, "resourceName")
-        )
-        pid = self._extract_variant_map_int(raw, "pid")
+        info = self._parse_variant_map(raw)
+        title = str(info.get("caption") or "")
+        app = str(info.get("resourceClass") or info.get("desktopFile") or info.get("resourceName") or "")
+        pid = self._coerce_int(info.get("pid"))
         app = self._resolve_app_name(app=app, pid=pid, title=title)
 
         return ActiveWindow(app=app, title=title, source="kwin_dbus", pid=pid)
@@ -246,67 +459,50 @@ class WindowDetector:
         if not window_id:
             return None
 
-        title = self._extract_quoted(self._run(["xprop", "-id", window_id, "WM_NAME"]) or "")
-        if not title:
-            title = self._extract_quoted(self._run(["xprop", "-id", window_id, "_NET_WM_NAME"]) or "")
-        wm_class_raw = self._run(["xprop", "-id", window_id, "WM_CLASS"]) or ""
-
-        app = self._extract_last_quoted(wm_class_raw)
-        pid = self._pid_for_window(window_id)
-        app = self._resolve_app_name(app=app, pid=pid, title=title)
-
-        return ActiveWindow(app=app, title=title, source="x11", pid=pid, window_id=window_id)
+        return self._x11_window(window_id)
 
     def _list_kdotool_windows(self, limit: int) -> list[ActiveWindow]:
         raw = self._run(["kdotool", "search", ""], timeout=2.0)
         if not raw:
             return []
-        ids = [line.strip() for line in raw.splitlines() if line.strip()]
-        unique_ids: list[str] = []
-        seen: set[str] = set()
-        for wid in ids:
-            if wid in seen:
-                continue
-            seen.add(wid)
-            unique_ids.append(wid)
-
-        windows: list[ActiveWindow] = []
-        for wid in unique_ids[:limit]:
-            title = self._run(["kdotool", "getwindowname", wid]) or ""
-            app = self._run(["kdotool", "getwindowclassname", wid]) or ""
-            pid = self._coerce_int(self._run(["kdotool", "getwindowpid", wid]) or "")
-            app = self._resolve_app_name(app=app, pid=pid, title=title)
-            windows.append(ActiveWindow(app=app, title=title, source="kdotool", pid=pid, window_id=wid))
-
-        return windows
+        return self._map_windows(self._kdotool_window, self._unique_window_ids(raw, limit))
 
     def _list_x11_windows(self, limit: int) -> list[ActiveWindow]:
         raw = self._run(["xdotool", "search", "--all", "--name", ".*"], timeout=2.0)
         if not raw:
             return []
-        ids = [line.strip() for line in raw.splitlines() if line.strip()]
-        windows: list[ActiveWindow] = []
+        return self._map_windows(self._x11_window, self._unique_window_ids(raw, limit))
+
+    def _unique_window_ids(self, raw: str, limit: int) -> list[str]:
+        # Una sola pasada: limpia, deduplica y corta en cuanto llegamos al límite.
+        unique_ids: list[str] = []
         seen: set[str] = set()
-        for wid in ids:
-            if wid in seen:
+        for line in raw.splitlines():
+            wid = line.strip()
+            if not wid or wid in seen:
                 continue
             seen.add(wid)
-            title = self._extract_quoted(self._run(["xprop", "-id", wid, "WM_NAME"]) or "")
-            if not title:
-                title = self._extract_quoted(self._run(["xprop", "-id", wid, "_NET_WM_NAME"]) or "")
-            app = self._extract_last_quoted(self._run(["xprop", "-id", wid, "WM_CLASS"]) or "")
-            pid = self._pid_for_window(wid)
-            app = self._resolve_app_name(app=app, pid=pid, title=title)
-            windows.append(ActiveWindow(app=app, title=title, source="x11", pid=pid, window_id=wid))
-            if len(windows) >= limit:
+            unique_ids.append(wid)
+            if len(unique_ids) >= limit:
                 break
-        return windows
+        return unique_ids
+
+    def _map_windows(self, fetch: Callable[[str], ActiveWindow], window_ids: list[str]) -> list[ActiveWindow]:
+        # Cada ventana son subprocesos independientes: los lanzamos en paralelo conservando el orden.
+        if len(window_ids) <= 1:
+            return [fetch(wid) for wid in window_ids]
+        workers = min(_LIST_WORKERS, len(window_ids))
+        with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="list-windows") as pool:
+            return list(pool.map(fetch, window_ids))
 
     def _extract_quoted(self, text: str) -> str:
-        # Soporta WM_NAME(STRING) = "Texto"
-        match = re.search(r'"(.*)"', text)
-        if match:
-            return match.group(1).strip()
+        # Soporta WM_NAME(STRING) = "Texto": de la primera a la última comilla de esa línea.
+        start = text.find('"')
+        if start >= 0:
+            line_end = text.find("\n", start)
+            end = text.rfind('"', start + 1, line_end if line_end >= 0 else len(text))
+            if end > start:
+                return text[start + 1 : end].strip()
 
         # Fallback para formatos sin comillas
         parts = text.split("=", maxsplit=1)
@@ -315,13 +511,23 @@ class WindowDetector:
         return ""
 
     def _extract_last_quoted(self, text: str) -> str:
-        matches = re.findall(r'"([^"]+)"', text)
-        if not matches:
-            return ""
-        return matches[-1].strip()
+        # Último valor entre comillas no vacío, emparejando de izquierda a derecha como el
+        # antiguo '"([^"]+)"': en WM_CLASS = "foo", "" devuelve "foo", no la cadena vacía.
+        last = ""
+        start = text.find('"')
+        while start >= 0:
+            end = text.find('"', start + 1)
+            if end < 0:
+                break
+            if end == start + 1:
+                start = end
+                continue
+            last = text[start + 1 : end]
+            start = text.find('"', end + 1)
+        return last.strip()
 
     def _extract_pid(self, text: str) -> int | None:
-        match = re.search(r"(\d+)", text)
+        match = _PID_RE.search(text)
         if not match:
             return None
         try:
@@ -329,36 +535,55 @@ class WindowDetector:
         except ValueError:
             return None
 
-    def _extract_variant_map_value(self, text: str, key: str) -> str:
-        # Parsea fragmentos tipo: 'caption': <'Título'>
-        pattern = rf"'{re.escape(key)}'\s*:\s*<'((?:\\'|[^'])*)'>"
-        match = re.search(pattern, text)
-        if not match:
-            return ""
-        return match.group(1).replace("\\'", "'").strip()
-
-    def _extract_variant_map_int(self, text: str, key: str) -> int | None:
-        pattern = rf"'{re.escape(key)}'\s*:\s*<(-?\d+)>"
-        match = re.search(pattern, text)
-        if not match:
-            return None
-        try:
-            return int(match.group(1))
-        except ValueError:
-            return None
+    def _parse_variant_map(self, text: str) -> dict[str, str | int]:
+        # Una sola pasada sobre fragmentos tipo: 'caption': <'Título'>, 'pid': <1234>
+        values: dict[str, str | int] = {}
+        for match in _VARIANT_ENTRY_RE.finditer(text):
+            key, string_value, int_value = match.groups()
+            if key in values:
+                continue
+            if string_value is not None:
+                values[key] = string_value.replace("\\'", "'").strip()
+            else:
+                values[key] = int(int_value)
+        return values
+
+    def _x11_window(self, window_id: str) -> ActiveWindow:
+        # Un solo xprop con todos los átomos en vez de un proceso por propiedad.
+        props = self._parse_xprop_output(
+            self._run(["xprop", "-id", window_id, "WM_NAME", "_NET_WM_NAME", "WM_CLASS", "_NET_WM_PID"]) or ""
+        )
+        title = self._extract_quoted(props.get("WM_NAME", ""))
+        if not title:
+            title = self._extract_quoted(props.get("_NET_WM_NAME", ""))
+        app = self._extract_last_quoted(props.get("WM_CLASS", ""))
+        pid = self._extract_pid(props.get("_NET_WM_PID", ""))
+        if pid is None:
+            pid = self._extract_pid(self._run(["xdotool", "getwindowpid", window_id]) or "")
+        app = self._resolve_app_name(app=app, pid=pid, title=title)
+        return ActiveWindow(app=app, title=title, source="x11", pid=pid, window_id=window_id)
 
-    def _pid_for_window(self, window_id: str) -> int | None:
-        pid = self._extract_pid(self._run(["xprop", "-id", window_id, "_NET_WM_PID"]) or "")
-        if pid is not None:
-            return pid
-        return self._extract_pid(self._run(["xdotool", "getwindowpid", window_id]) or "")
+    def _parse_xprop_output(self, raw: str) -> dict[str, str]:
+        # Líneas tipo: WM_CLASS(STRING) = "navigator", "firefox"
+        props: dict[str, str] = {}
+        for line in raw.splitlines():
+            head, sep, _ = line.partition(" = ")
+            if not sep:
+                continue
+            atom = head.split("(", 1)[0].strip()
+            if atom and atom not in props:
+                props[atom] = line
+        return props
 
     def _process_name_from_pid(self, pid: int | None) -> str:
         if pid is None:
             return ""
+        # comm es una sola línea de <=16 bytes; psutil.Process abriría varios ficheros de /proc.
+        # Sólo se llega aquí si cmdline vino vacío, así que el truncado a 15 caracteres no molesta.
         try:
-            return (psutil.Process(pid).name() or "").strip()
-        except (psutil.Error, ProcessLookupError):
+            with open(f"/proc/{pid}/comm", "rb") as fh:
+                return fh.read(64).decode("utf-8", "replace").strip()
+        except OSError:
             return ""
 
     def _process_exe_from_pid(self, pid: int | None) -> str:
@@ -458,38 +683,9 @@ class WindowDetector:
             return "Proceso"
 
         lower = value.casefold()
-        aliases = {
-            "org.kde.konsole": "Konsole",
-            "org.kde.dolphin": "Dolphin",
-            "org.telegram.desktop": "Telegram",
-            "brave-browser": "Brave",
-            "brave": "Brave",
-            "chrome": "Chrome",
-            "google-chrome": "Chrome",
-            "chromium": "Chromium",
-            "chromium-browser": "Chromium",
-            "firefox": "Firefox",
-            "firefox-bin": "Firefox",
-            "code": "VS Code",
-            "code-oss": "VS Code",
-            "cursor": "Cursor",
-            "dev.aunetx.deezer": "Deezer",
-            "deezer-desktop": "Deezer",
-            "deezer": "Deezer",
-            "spotify": "Spotify",
-            "antigravity": "Antigravity",
-            "obsidian": "Obsidian",
-            "libreoffice": "LibreOffice",
-            "discord": "Discord",
-            "slack": "Slack",
-            "teams": "Teams",
-            "telegram": "Telegram",
-            "konsole": "Konsole",
-            "kitty": "Kitty",
-            "alacritty": "Alacritty",
-        }
-        if lower in aliases:
-            return aliases[lower]
+        alias = _APP_ALIASES.get(lower)
+        if alias is not None:
+            return alias
 
         if "." in value and " " not in value:
             tail = value.split(".")[-1]
@@ -497,14 +693,13 @@ class WindowDetector:
                 value = tail
 
         value = value.removesuffix(".desktop")
-        value = re.sub(r"[-_]+", " ", value).strip()
+        value = _SEPARATORS_RE.sub(" ", value).strip()
         if not value:
             return "Proceso"
 
-        upper_tokens = {"vscode": "VS Code", "api": "API", "ui": "UI", "db": "DB", "pdf": "PDF"}
-        low_value = value.casefold().replace(" ", "")
-        if low_value in upper_tokens:
-            return upper_tokens[low_value]
+        upper_token = _UPPER_TOKENS.get(value.casefold().replace(" ", ""))
+        if upper_token is not None:
+            return upper_token
 
         if any(ch.isupper() for ch in value):
             return value
@@ -517,14 +712,16 @@ class WindowDetector:
             return None
 
     def _is_kwin_running(self) -> bool:
-        for proc in psutil.process_iter(attrs=["name"]):
-            name = (proc.info.get("name") or "").lower()
-            if name in {"kwin_wayland", "kwin_x11"}:
-                return True
-        return False
+        now = time.monotonic()
+        if self._kwin_running_cache and (now - self._kwin_running_cache[0]) < _SYSTEM_PROBE_TTL_SECONDS:
+            return self._kwin_running_cache[1]
+
+        running = _any_process_named(_KWIN_PROCESSES)
+        self._kwin_running_cache = (now, running)
+        return running
 
     def _can_use_kwin_dbus(self) -> bool:
-        if not self._has_gdbus or not self._is_kwin_running():
+        if not (self._has_gdbus or self._bus.available) or not self._is_kwin_running():
             return False
 
         now = time.time()
@@ -534,6 +731,11 @@ class WindowDetector:
             if (now - cached_at) < ttl:
                 return cached_ok
 
+        if self._bus.available:
+            ok = self._bus.name_has_owner("org.kde.KWin")
+            self._kwin_probe_cache = (now, ok)
+            return ok
+
         raw = self._run(
             [
                 "gdbus",
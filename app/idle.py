@@ -1,126 +1,316 @@
 from __future__ import annotations
 
+import math
 import os
 import re
+import select
 import shutil
 import subprocess
 import threading
 import time
 from dataclasses import dataclass
-from typing import Iterable
+from typing import Callable, Iterable
 
+from .sessionbus import SessionBus
 
-@dataclass
+
+_DIGITS_RE = re.compile(rb"\b(\d+)\b")
+_SCREENSAVER_RETRY_NS = 30_000_000_000
+# El idle no cambia de forma útil por debajo del medio segundo: entre sondeos se reutiliza la última lectura.
+_MIN_TTL_NS = 500_000_000
+_MAX_TTL_NS = 5_000_000_000
+
+
+@dataclass(frozen=True, slots=True)
 class IdleSample:
     seconds: int | None
     backend: str
     available: bool
     checked_ts: int
+    checked_mono_ns: int = 0
+
+
+class _InputMonitor:
+    """Lee /dev/input/event* (teclados y ratones) en un hilo y recuerda el último evento."""
+
+    def __init__(self) -> None:
+        # Aquí sólo se localizan los dispositivos: se abren en start() y se cierran al parar,
+        # así no quedan descriptores abiertos si el detector nunca arranca.
+        self._paths = self._device_paths()
+        self._fds: list[int] = []
+        self._last_input_ns = time.monotonic_ns()
+        self._thread: threading.Thread | None = None
+        self._stop_event = threading.Event()
+
+    @property
+    def available(self) -> bool:
+        return self.running or bool(self._paths)
+
+    @property
+    def running(self) -> bool:
+        return bool(self._thread and self._thread.is_alive())
+
+    def start(self) -> None:
+        if self.running:
+            return
+        # Se vuelve a evaluar en cada arranque: tras un stop() los dispositivos pueden haber cambiado.
+        self._paths = self._device_paths()
+        self._fds = self._open_devices(self._paths)
+        if not self._fds:
+            self._paths = []
+            return
+        self._stop_event.clear()
+        self._last_input_ns = time.monotonic_ns()
+        self._thread = threading.Thread(target=self._run, name="idle-input-monitor", daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stop_event.set()
+        if self._thread and self._thread.is_alive():
+            self._thread.join(timeout=2)
+
+    def idle_seconds(self) -> int | None:
+        if not self.running:
+            return None
+        return (time.monotonic_ns() - self._last_input_ns) // 1_000_000_000
+
+    def _device_paths(self) -> list[str]:
+        try:
+            with open("/proc/bus/input/devices", "r", encoding="utf-8") as fh:
+                content = fh.read()
+        except OSError:
+            return []
+
+        paths: list[str] = []
+        for line in content.splitlines():
+            if not line.startswith("H: Handlers="):
+                continue
+            handlers = line.split("=", 1)[1].split()
+            if "kbd" not in handlers and "mouse" not in handlers:
+                continue
+            for handler in handlers:
+                path = f"/dev/input/{handler}"
+                # Sin permisos (grupo input) el dispositivo no cuenta como disponible.
+                if handler.startswith("event") and os.access(path, os.R_OK):
+                    paths.append(path)
+        return paths
+
+    def _open_devices(self, paths: list[str]) -> list[int]:
+        fds: list[int] = []
+        for path in paths:
+            try:
+                fds.append(os.open(path, os.O_RDONLY | os.O_NONBLOCK))
+            except OSError:
+                # Sin permisos o dispositivo desaparecido.
+                continue
+        return fds
+
+    def _run(self) -> None:
+        try:
+            while self._fds and not self._stop_event.is_set():
+                try:
+                    ready, _, _ = select.select(self._fds, [], [], 1.0)
+                except (OSError, ValueError):
+                    break
+                if not ready:
+                    continue
+                for fd in ready:
+                    self._drain(fd)
+                self._last_input_ns = time.monotonic_ns()
+        finally:
+            for fd in self._fds:
+                os.close(fd)
+            self._fds = []
+            if not self._stop_event.is_set():
+                # Se desconectaron todos los dispositivos: evdev deja de estar disponible hasta
+                # el próximo start().
+                self._paths = []
+
+    def _drain(self, fd: int) -> None:
+        while True:
+            try:
+                if os.read(fd, 4096):
+                    continue
+            except BlockingIOError:
+                return
+            except OSError:
+                pass
+            # EOF o error: el dispositivo se desconectó y dejamos de vigilarlo.
+            self._fds = [other for other in self._fds if other != fd]
+            os.close(fd)
+            return
 
 
 class IdleDetector:
-    def __init__(self, enabled: bool = True) -> None:
+    def __init__(
+        self,
+        enabled: bool = True,
+        input_monitor: bool = False,
+        strict_units: bool = True,
+        refresh_interval_seconds: float | None = None,
+        probe_timeout: float = 0.3,
+        bus: SessionBus | None = None,
+    ) -> None:
         self.enabled = bool(enabled)
-        self._has_xprintidle = shutil.which("xprintidle") is not None
-        self._has_xssstate = shutil.which("xssstate") is not None
-        self._has_gdbus = shutil.which("gdbus") is not None
-        self._has_loginctl = shutil.which("loginctl") is not None
-        self._lock = threading.Lock()
-        self._last_sample = IdleSample(seconds=None, backend="none", available=False, checked_ts=0)
+        # Un D-Bus colgado puede tardar ~25 s en fallar: cada sondeo queda acotado a este tiempo.
+        self._probe_timeout = max(0.05, float(probe_timeout))
+        self._strict_units = bool(strict_units)
+        self._refresh_interval_ns = (
+            int(max(0.5, float(refresh_interval_seconds)) * 1_000_000_000) if refresh_interval_seconds else 0
+        )
+        self._refresh_thread: threading.Thread | None = None
+        self._refresh_stop = threading.Event()
+        # El hilo de refresco y un sondeo síncrono (force_refresh o muestra vencida) no deben
+        # lanzar los mismos backends a la vez.
+        self._probe_lock = threading.Lock()
+        self._input_monitor = _InputMonitor() if self.enabled and input_monitor else None
+        # Rutas absolutas resueltas una vez: junto con close_fds=False dejan a subprocess usar posix_spawn.
+        self._executables = {
+            name: path
+            for name in ("xprintidle", "xssstate", "gdbus", "loginctl")
+            if (path := shutil.which(name)) is not None
+        }
+        self._has_xprintidle = "xprintidle" in self._executables
+        self._has_xssstate = "xssstate" in self._executables
+        self._has_gdbus = "gdbus" in self._executables
+        # Se comparte con WindowDetector cuando se pasa: una sola conexión al bus de sesión.
+        self._bus = bus if bus is not None else SessionBus()
+        self._has_screensaver_dbus = self._has_gdbus or self._bus.available
+        self._screensaver_retry_ns = 0
+        self._has_loginctl = "loginctl" in self._executables
+        # El entorno para gdbus se arma una vez en vez de copiar os.environ en cada sondeo.
+        self._gdbus_env = self._build_gdbus_env() if self._has_gdbus else None
+        # Cadena de backends en orden de preferencia, resuelta una sola vez.
+        candidates = (
+            (self._input_monitor is not None and self._input_monitor.available, "evdev", self._get_idle_evdev),
+            (self._has_xprintidle, "xprintidle", self._get_idle_xprintidle),
+            (self._has_xssstate, "xssstate", self._get_idle_xssstate),
+            (self._has_screensaver_dbus, "screensaver_dbus", self._get_idle_screensaver_dbus),
+            (self._has_loginctl, "logind", self._get_idle_logind),
+        )
+        self._backend_chain: tuple[tuple[str, Callable[[], int | None]], ...] = tuple(
+            (name, probe) for enabled, name, probe in candidates if enabled
+        )
+        self._backends = tuple(name for name, _ in self._backend_chain)
+        # Publicación sin lock: _last_sample es inmutable y se reemplaza con una sola asignación,
+        # así que los lectores siempre ven una muestra completa.
+        self._last_sample = IdleSample(
+            seconds=None,
+            backend="none" if self.enabled else "disabled",
+            available=False,
+            checked_ts=int(time.time()),
+        )
 
-    def capabilities(self) -> dict[str, object]:
-        backends: list[str] = []
-        if self._has_xprintidle:
-            backends.append("xprintidle")
-        if self._has_xssstate:
-            backends.append("xssstate")
-        if self._has_gdbus:
-            backends.append("screensaver_dbus")
-        if self._has_loginctl:
-            backends.append("logind")
-
-        preferred = "none"
-        if self._has_xprintidle:
-            preferred = "xprintidle"
-        elif self._has_xssstate:
-            preferred = "xssstate"
-        elif self._has_gdbus:
-            preferred = "screensaver_dbus"
-        elif self._has_loginctl:
-            preferred = "logind"
-
-        with self._lock:
-            sample = self._last_sample
+    def start(self) -> None:
+        if self._input_monitor is not None:
+            self._input_monitor.start()
+        if not self._refresh_interval_ns or not self.enabled or not self._backend_chain:
+            return
+        if self._refresh_thread and self._refresh_thread.is_alive():
+            return
+        self._refresh_stop.clear()
+        self._refresh_thread = threading.Thread(target=self._refresh_loop, name="idle-refresher", daemon=True)
+        self._refresh_thread.start()
+
+    def stop(self) -> None:
+        self._refresh_stop.set()
+        if self._refresh_thread and self._refresh_thread.is_alive():
+            self._refresh_thread.join(timeout=3)
+        if self._input_monitor is not None:
+            self._input_monitor.stop()
 
+    def capabilities(self) -> dict[str, object]:
+        sample = self._last_sample
+        backends = self._backends
+        # evdev es el único backend que puede dejar de estar disponible (dispositivos
+        # desconectados o sin permisos al rearrancar): entonces manda el siguiente de la cadena.
+        if backends and backends[0] == "evdev" and not self._input_monitor.available:
+            backends = backends[1:]
         return {
             "enabled": self.enabled,
             "available": self.enabled and bool(backends),
-            "backends": backends,
-            "preferred_backend": preferred,
+            "preferred_backend": backends[0] if backends else "none",
+            "backends": list(backends),
             "last_backend": sample.backend,
             "last_idle_seconds": sample.seconds,
             "last_checked_ts": sample.checked_ts,
         }
 
-    def get_idle_seconds(self) -> int | None:
-        if not self.enabled:
-            self._store(None, "disabled", False)
+    def get_idle_seconds(self, force_refresh: bool = False) -> int | None:
+        if not self.enabled or not self._backend_chain:
+            # Estado terminal ya publicado en __init__: nada que sondear ni que escribir.
+            return None
+
+        sample = self._last_sample
+        if not force_refresh and sample.available and sample.seconds is not None:
+            elapsed_ns = time.monotonic_ns() - sample.checked_mono_ns
+            # Un acierto no publica nada nuevo: el TTL no se alarga indefinidamente.
+            if elapsed_ns < self._max_sample_age_ns(sample.seconds):
+                return sample.seconds + elapsed_ns // 1_000_000_000
+
+        return self._probe()
+
+    def _max_sample_age_ns(self, idle_seconds: int) -> int:
+        ttl_ns = self._ttl_for(idle_seconds)
+        if not self._refresher_running():
+            return ttl_ns
+        # El hilo publica cada max(intervalo, TTL); el doble deja margen para un sondeo lento.
+        # Si se atasca más que eso, la muestra deja de extrapolarse y se sondea en el momento.
+        return 2 * max(self._refresh_interval_ns, ttl_ns)
+
+    def _refresher_running(self) -> bool:
+        thread = self._refresh_thread
+        return thread is not None and thread.is_alive()
+
+    def _refresh_loop(self) -> None:
+        # Sondea fuera de la ruta de los llamadores: el tracker y la API sólo leen _last_sample.
+        while not self._refresh_stop.is_set():
+            self._probe()
+            seconds = self._last_sample.seconds or 0
+            wait_ns = max(self._refresh_interval_ns, self._ttl_for(seconds))
+            self._refresh_stop.wait(wait_ns / 1_000_000_000)
+
+    def _probe(self) -> int | None:
+        with self._probe_lock:
+            for backend, probe in self._backend_chain:
+                value = probe()
+                if value is not None:
+                    self._store(value, backend, True)
+                    return value
+
+            self._store(None, "none", False)
             return None
 
-        if self._has_xprintidle:
-            value = self._get_idle_xprintidle()
-            if value is not None:
-                self._store(value, "xprintidle", True)
-                return value
-
-        if self._has_xssstate:
-            value = self._get_idle_xssstate()
-            if value is not None:
-                self._store(value, "xssstate", True)
-                return value
-
-        if self._has_gdbus:
-            value = self._get_idle_screensaver_dbus()
-            if value is not None:
-                self._store(value, "screensaver_dbus", True)
-                return value
-
-        if self._has_loginctl:
-            value = self._get_idle_logind()
-            if value is not None:
-                self._store(value, "logind", True)
-                return value
-
-        self._store(None, "none", False)
-        return None
+    def _ttl_for(self, idle_seconds: int) -> int:
+        # TTL adaptativo: con el usuario ya inactivo, sondear cada medio segundo no aporta nada.
+        # Se limita a unos segundos porque ese es también el retraso para notar que volvió.
+        return min(_MAX_TTL_NS, max(_MIN_TTL_NS, idle_seconds * 1_000_000_000 // 20))
 
     def _store(self, seconds: int | None, backend: str, available: bool) -> None:
-        with self._lock:
-            self._last_sample = IdleSample(
-                seconds=seconds,
-                backend=backend,
-                available=available,
-                checked_ts=int(time.time()),
-            )
+        self._last_sample = IdleSample(
+            seconds=seconds,
+            backend=backend,
+            available=available,
+            checked_ts=int(time.time()),
+            checked_mono_ns=time.monotonic_ns(),
+        )
 
-    def _run(self, args: list[str], timeout: float = 1.2) -> str | None:
-        env = None
-        if args and args[0] == "gdbus":
-            env = os.environ.copy()
-            runtime_dir = env.get("XDG_RUNTIME_DIR") or f"/run/user/{os.getuid()}"
-            bus_path = f"{runtime_dir}/bus"
-            if "XDG_RUNTIME_DIR" not in env and os.path.exists(runtime_dir):
-                env["XDG_RUNTIME_DIR"] = runtime_dir
-            if not env.get("DBUS_SESSION_BUS_ADDRESS") and os.path.exists(bus_path):
-                env["DBUS_SESSION_BUS_ADDRESS"] = f"unix:path={bus_path}"
+    def _run(self, args: list[str]) -> bytes | None:
+        env = self._gdbus_env if args and args[0] == "gdbus" else None
+        executable = self._executables.get(args[0]) if args else None
+        if executable is None:
+            return None
 
         try:
             out = subprocess.run(
                 args,
+                executable=executable,
+                close_fds=False,
                 check=False,
-                capture_output=True,
-                text=True,
-                timeout=timeout,
+                stdin=subprocess.DEVNULL,
+                stdout=subprocess.PIPE,
+                stderr=subprocess.DEVNULL,
+                timeout=self._probe_timeout,
                 env=env,
             )
         except (subprocess.SubprocessError, OSError):
@@ -130,27 +320,46 @@ class IdleDetector:
             return None
         return out.stdout.strip()
 
+    def _build_gdbus_env(self) -> dict[str, str]:
+        env = os.environ.copy()
+        runtime_dir = env.get("XDG_RUNTIME_DIR") or f"/run/user/{os.getuid()}"
+        bus_path = f"{runtime_dir}/bus"
+        if "XDG_RUNTIME_DIR" not in env and os.path.exists(runtime_dir):
+            env["XDG_RUNTIME_DIR"] = runtime_dir
+        if not env.get("DBUS_SESSION_BUS_ADDRESS") and os.path.exists(bus_path):
+            env["DBUS_SESSION_BUS_ADDRESS"] = f"unix:path={bus_path}"
+        return env
+
     def _normalize_idle_value(self, raw_value: int) -> int:
+        # xprintidle, xssstate y GetSessionIdleTime devuelven milisegundos.
         value = max(0, int(raw_value))
+        if self._strict_units:
+            return value // 1000
+        # Heurística anterior: valores < 1000 se trataban como segundos.
         if value >= 1000:
             return value // 1000
         return value
 
+    def _get_idle_evdev(self) -> int | None:
+        if self._input_monitor is None:
+            return None
+        return self._input_monitor.idle_seconds()
+
     def _get_idle_xprintidle(self) -> int | None:
-        raw = self._run(["xprintidle"], timeout=0.8)
+        raw = self._run(["xprintidle"])
         if not raw:
             return None
         try:
-            milliseconds = int(raw.strip())
+            milliseconds = int(raw)
         except ValueError:
             return None
         return self._normalize_idle_value(milliseconds)
 
     def _get_idle_xssstate(self) -> int | None:
-        raw = self._run(["xssstate", "-i"], timeout=0.8)
+        raw = self._run(["xssstate", "-i"])
         if not raw:
             return None
-        match = re.search(r"(\d+)", raw)
+        match = _DIGITS_RE.search(raw)
         if not match:
             return None
         try:
@@ -160,11 +369,37 @@ class IdleDetector:
         return self._normalize_idle_value(milliseconds)
 
     def _get_idle_screensaver_dbus(self) -> int | None:
+        # Si el servicio ScreenSaver no responde (p. ej. fuera de KDE/GNOME), no lo reintentamos
+        # en cada sondeo: cada fallo costaba un gdbus completo antes de llegar a logind.
+        now_ns = time.monotonic_ns()
+        if now_ns < self._screensaver_retry_ns:
+            return None
+        value = self._query_screensaver_dbus()
+        if value is None:
+            self._screensaver_retry_ns = now_ns + _SCREENSAVER_RETRY_NS
+        return value
+
+    def _query_screensaver_dbus(self) -> int | None:
+        if self._bus.available:
+            reply = self._bus.call(
+                "org.freedesktop.ScreenSaver",
+                "/org/freedesktop/ScreenSaver",
+                "org.freedesktop.ScreenSaver",
+                "GetSessionIdleTime",
+                timeout=self._probe_timeout,
+            )
+            if not reply:
+                return None
+            return self._normalize_idle_value(reply[0])
+
         raw = self._run(
             [
                 "gdbus",
                 "call",
                 "--session",
+                # gdbus sólo acepta segundos enteros; el límite real lo pone el timeout de _run.
+                "--timeout",
+                str(max(1, math.ceil(self._probe_timeout))),
                 "--dest",
                 "org.freedesktop.ScreenSaver",
                 "--object-path",
@@ -172,12 +407,14 @@ class IdleDetector:
                 "--method",
                 "org.freedesktop.ScreenSaver.GetSessionIdleTime",
             ],
-            timeout=1.4,
         )
         if not raw:
+            # Puede que el bus no existiera al arrancar: se reconstruye el entorno. El backoff de
+            # _get_idle_screensaver_dbus limita esto a una vez cada 30 s.
+            self._gdbus_env = self._build_gdbus_env()
             return None
 
-        match = re.search(r"(\d+)", raw)
+        match = _DIGITS_RE.search(raw)
         if not match:
             return None
 
@@ -202,9 +439,9 @@ class IdleDetector:
             return None
         return int(seconds * 1_000_000)
 
-    def _parse_key_value_lines(self, raw: str) -> dict[str, str]:
+    def _parse_key_value_lines(self, raw: bytes) -> dict[str, str]:
         data: dict[str, str] = {}
-        for line in raw.splitlines():
+        for line in raw.decode("utf-8", "replace").splitlines():
             if "=" not in line:
                 continue
             key, value = line.split("=", 1)
@@ -223,7 +460,7 @@ class IdleDetector:
             return env_session_id
 
         uid = str(os.getuid())
-        raw = self._run(["loginctl", "show-user", uid, "-p", "Display", "-p", "Sessions", "--no-pager"], timeout=1.4)
+        raw = self._run(["loginctl", "show-user", uid, "-p", "Display", "-p", "Sessions", "--no-pager"])
         if not raw:
             return ""
 
@@ -255,7 +492,6 @@ class IdleDetector:
                 "Type",
                 "--no-pager",
             ],
-            timeout=1.4,
         )
         if not raw:
             return None
@@ -1,37 +1,89 @@
 from __future__ import annotations
 
 import csv
+import heapq
 import io
 import os
+import sys
 import time
+from bisect import insort
+from collections import Counter, defaultdict
+from collections.abc import Iterator
 from contextlib import asynccontextmanager
-from dataclasses import dataclass
+from dataclasses import dataclass, field
 from datetime import date as date_cls
-from datetime import datetime, timedelta
+from datetime import datetime, timedelta, timezone
+from functools import lru_cache, wraps
+from operator import add, itemgetter
 from pathlib import Path
+from typing import Callable, NamedTuple, TypeVar
 
-from fastapi import FastAPI, HTTPException, Query
-from fastapi.responses import FileResponse, JSONResponse, Response
+import orjson
+from fastapi import FastAPI, HTTPException, Query, Request
+from fastapi.concurrency import run_in_threadpool
+from fastapi.exceptions import RequestValidationError
+from fastapi.responses import FileResponse, ORJSONResponse, Response, StreamingResponse
 from fastapi.staticfiles import StaticFiles
-from pydantic import BaseModel, Field
+from pydantic import BaseModel, Field, ValidationError
 
 from .db import ActivityDB, PrivacyRuleRow, SessionRow
 from .detector import ActiveWindow, WindowDetector
 from .idle import IdleDetector
 from .privacy import PrivacyFilter, PrivacyRule
+from .sessionbus import SessionBus
 from .tracker import ActivityTracker
 
+_T = TypeVar("_T")
 
-@dataclass
-class Segment:
+_EPOCH_ORDINAL = date_cls(1970, 1, 1).toordinal()
+_HEALTH_CAPS_TTL_SECONDS = 3.0
+_CSV_EXPORT_FIELDS = ("start_iso", "end_iso", "duration_seconds", "duration_human", "app", "title", "source")
+_CSV_FLUSH_ROWS = 1000
+_BACKUP_BATCH_ROWS = 1000
+_TOP_GROUPS_LIMIT = 50
+
+_AFK_LABELS = frozenset({"inactivo", "idle", "afk"})
+_SLEEP_LABELS = frozenset(
+    {
+        "suspensión/hibernación",
+        "suspension/hibernacion",
+        "suspensión",
+        "suspension",
+        "hibernación",
+        "hibernacion",
+    }
+)
+_KWIN_APPS = frozenset({"kwin wayland", "kwin_wayland"})
+_SYSTEM_APPS = _KWIN_APPS | {"plasmashell"}
+_UNATTRIBUTED_LABELS = frozenset({"proceso", "desconocido"})
+_SLEEP_APP_LABEL = "Suspensión/Hibernación"
+_SLEEP_APP_NORM = _SLEEP_APP_LABEL.casefold()
+# Sesiones de KWin sin título de al menos esta duración se cuentan como suspensión.
+_SLEEP_FALSE_FOCUS_SECONDS = 900
+
+
+# Clase de estado de cada segmento en _build_overview. Son excluyentes: el bucle por hora suma
+# una sola vez por tramo y activo (efectivo + pasivo) y el total se derivan al final.
+_EFFECTIVE, _PASSIVE, _AFK, _SLEEP = range(4)
+_STATUS_COUNT = 4
+
+
+class Segment(NamedTuple):
+    # Mismo orden de columnas que db.clipped_sessions: las filas de SQLite ya son segmentos
+    # válidos y el resumen las recorre desempaquetando, sin crear un objeto por fila.
     app: str
     title: str
     source: str
     start_ts: int
     end_ts: int
+    # Se calcula una vez al leer o recortar; el resumen no vuelve a hacer strip() del título.
+    has_title: bool
+
 
+SegmentRow = tuple[str, str, str, int, int, int]
 
-@dataclass
+
+@dataclass(slots=True)
 class RangeSpec:
     mode: str
     start: datetime
@@ -84,6 +136,24 @@ class BackupRestoreRequest(BaseModel):
     privacy_rules: list[BackupPrivacyRule] = Field(default_factory=list)
 
 
+def _inline_schema(model: type[BaseModel]) -> dict[str, object]:
+    # Para openapi_extra: las referencias #/$defs/... no se resolverían desde la raíz del documento.
+    schema = model.model_json_schema()
+    defs = schema.pop("$defs", {})
+
+    def resolve(node: object) -> object:
+        if isinstance(node, dict):
+            ref = node.get("$ref")
+            if isinstance(ref, str) and ref.startswith("#/$defs/"):
+                return resolve(defs[ref.removeprefix("#/$defs/")])
+            return {key: resolve(value) for key, value in node.items()}
+        if isinstance(node, list):
+            return [resolve(item) for item in node]
+        return node
+
+    return resolve(schema)
+
+
 def _parse_bool(raw: str | None, default: bool) -> bool:
     if raw is None:
         return default
@@ -95,14 +165,42 @@ def _parse_bool(raw: str | None, default: bool) -> bool:
     return default
 
 
+# Textos precalculados para menos de una hora: la resolución del tracker es de segundos y esas
+# duraciones (filas de /api/recent, horas y días cortos) son las que más se repiten.
+_SUB_HOUR_HUMAN = tuple(
+    [f"{seconds}s" for seconds in range(60)]
+    + [f"{minutes}m {seconds:02d}s" for minutes in range(1, 60) for seconds in range(60)]
+)
+
+
+@lru_cache(maxsize=8192)
 def _seconds_to_human(total_seconds: int) -> str:
-    hours, rem = divmod(max(0, int(total_seconds)), 3600)
-    minutes, seconds = divmod(rem, 60)
-    if hours > 0:
-        return f"{hours}h {minutes:02d}m"
-    if minutes > 0:
-        return f"{minutes}m {seconds:02d}s"
-    return f"{seconds}s"
+    total = max(0, int(total_seconds))
+    if total < 3600:
+        return _SUB_HOUR_HUMAN[total]
+    hours, rem = divmod(total, 3600)
+    return f"{hours}h {rem // 60:02d}m"
+
+
+def _ttl_cache(ttl_seconds: float) -> Callable[[Callable[[], _T]], Callable[[], _T]]:
+    """Memoiza una función sin argumentos durante ttl_seconds."""
+
+    def decorator(func: Callable[[], _T]) -> Callable[[], _T]:
+        cached: tuple[float, _T] | None = None
+
+        @wraps(func)
+        def wrapper() -> _T:
+            nonlocal cached
+            now = time.monotonic()
+            entry = cached
+            if entry is None or now >= entry[0]:
+                # Dos hilos pueden recalcular a la vez; es inocuo y evita un lock en la ruta caliente.
+                entry = cached = (now + ttl_seconds, func())
+            return entry[1]
+
+        return wrapper
+
+    return decorator
 
 
 def _parse_iso_date(raw: str, field_name: str) -> date_cls:
@@ -112,6 +210,13 @@ def _parse_iso_date(raw: str, field_name: str) -> date_cls:
         raise HTTPException(status_code=400, detail=f"{field_name} debe estar en formato YYYY-MM-DD") from exc
 
 
+def _normalize_group_by(group_by: str | None) -> str:
+    group_by_norm = (group_by or "app").strip().lower()
+    if group_by_norm not in {"app", "category"}:
+        raise HTTPException(status_code=400, detail="group_by debe ser app o category")
+    return group_by_norm
+
+
 def _resolve_range(
     mode: str,
     anchor_date_raw: str | None,
@@ -175,58 +280,93 @@ def _clip_segment(row: SessionRow, range_start: int, range_end: int) -> Segment
         source=row.source,
         start_ts=start_ts,
         end_ts=end_ts,
+        has_title=bool((row.title or "").strip()),
     )
 
 
-def _is_afk_label(app_label: str) -> bool:
-    return app_label.strip().casefold() in {"inactivo", "idle", "afk"}
-
-
-def _is_sleep_label(app_label: str) -> bool:
-    normalized = app_label.strip().casefold()
-    return normalized in {
-        "suspensión/hibernación",
-        "suspension/hibernacion",
-        "suspensión",
-        "suspension",
-        "hibernación",
-        "hibernacion",
-    }
+@lru_cache(maxsize=4096)
+def _app_labels(app: str) -> tuple[str, str]:
+    # Pocas apps distintas se repiten miles de veces por rango: se normalizan una sola vez y se
+    # internan, así todas las claves de los acumuladores son el mismo objeto (hash y == por identidad).
+    label = sys.intern(app.strip())
+    return label, sys.intern(label.casefold())
 
 
+@lru_cache(maxsize=256)
 def _is_passive_source(source: str) -> bool:
     value = (source or "").strip().casefold()
     return value.endswith(":idle") or value == "idle-passive"
 
 
-def _looks_like_sleep_false_focus(app_label: str, title: str, source: str, duration: int) -> bool:
-    app_norm = (app_label or "").strip().casefold()
-    title_norm = (title or "").strip()
+def _looks_like_sleep_false_focus(app_norm: str, has_title: bool, source: str, duration: int) -> bool:
     source_norm = (source or "").strip().casefold()
     return (
-        app_norm in {"kwin wayland", "kwin_wayland"}
-        and not title_norm
+        app_norm in _KWIN_APPS
+        and not has_title
         and source_norm.startswith("kdotool")
-        and duration >= 900
+        and duration >= _SLEEP_FALSE_FOCUS_SECONDS
     )
 
 
-def _category_for_app(app_label: str, category_map: dict[str, str]) -> str:
-    app = (app_label or "").strip()
-    if _is_afk_label(app):
+def _category_for_app(app: str, app_norm: str, category_map: dict[str, str]) -> str:
+    # app ya viene sin espacios y app_norm es su casefold: _aggregate_groups los calcula una vez por segmento.
+    if app_norm in _AFK_LABELS:
         return "Inactividad"
-    if _is_sleep_label(app):
+    if app_norm in _SLEEP_LABELS or app_norm in _SYSTEM_APPS:
         return "Sistema"
-    app_norm = app.casefold()
-    if app_norm in {"kwin wayland", "kwin_wayland", "plasmashell"}:
-        return "Sistema"
-    if app_norm in {"proceso", "desconocido"}:
+    if app_norm in _UNATTRIBUTED_LABELS:
         return "No identificado"
     return category_map.get(app, "Sin categoría")
 
 
-def _sorted_payload(by_key: dict[str, int], total_seconds: int) -> list[dict[str, object]]:
-    rows = sorted(by_key.items(), key=lambda item: item[1], reverse=True)
+def _fixed_utc_offset(tzinfo) -> int | None:
+    # El rango usa datetime.now().astimezone(), que da un desfase fijo: se calcula una sola vez.
+    if isinstance(tzinfo, timezone):
+        return int(tzinfo.utcoffset(None).total_seconds())
+    return None
+
+
+def _utc_offset_seconds(ts: int, tzinfo) -> int:
+    offset = datetime.fromtimestamp(ts, tz=tzinfo).utcoffset()
+    return int(offset.total_seconds()) if offset else 0
+
+
+@lru_cache(maxsize=64)
+def _offset_suffix(offset_seconds: int) -> str:
+    sign = "+" if offset_seconds >= 0 else "-"
+    hours, minutes = divmod(abs(offset_seconds) // 60, 60)
+    return f"{sign}{hours:02d}:{minutes:02d}"
+
+
+def _iso_formatter(tzinfo) -> Callable[[int], str]:
+    # Con desfase fijo basta gmtime + strftime (C) sobre ts + offset, sin crear un datetime por fila.
+    offset = _fixed_utc_offset(tzinfo)
+    if offset is None or offset % 60:
+        return lambda ts: datetime.fromtimestamp(ts, tz=tzinfo).isoformat()
+    suffix = _offset_suffix(offset)
+
+    def format_iso(ts: int) -> str:
+        return time.strftime("%Y-%m-%dT%H:%M:%S", time.gmtime(ts + offset)) + suffix
+
+    return format_iso
+
+
+@lru_cache(maxsize=4096)
+def _local_iso(ts: int) -> str:
+    # localtime() ya trae el desfase vigente en ese instante (tm_gmtoff), así que respeta cambios de horario.
+    # La caché cubre los límites compartidos entre sesiones contiguas y las filas repetidas entre sondeos.
+    local = time.localtime(ts)
+    return time.strftime("%Y-%m-%dT%H:%M:%S", local) + _offset_suffix(local.tm_gmtoff)
+
+
+def _sorted_payload(
+    by_key: dict[str, int], total_seconds: int, limit: int | None = None
+) -> list[dict[str, object]]:
+    if limit is None:
+        rows = sorted(by_key.items(), key=itemgetter(1), reverse=True)
+    else:
+        # nlargest es estable como sorted(): mismo orden ante empates, sin ordenar ni formatear el resto.
+        rows = heapq.nlargest(limit, by_key.items(), key=itemgetter(1))
     payload: list[dict[str, object]] = []
     for key, seconds in rows:
         percentage = (seconds / total_seconds * 100.0) if total_seconds else 0.0
@@ -241,14 +381,17 @@ def _sorted_payload(by_key: dict[str, int], total_seconds: int) -> list[dict[str
     return payload
 
 
-def _top_bucket_payload(by_key: dict[str, int], total_seconds: int) -> dict[str, object]:
+_EMPTY_TOP_BUCKET: dict[str, object] = {
+    "app": "",
+    "seconds": 0,
+    "human": _seconds_to_human(0),
+    "percentage": 0.0,
+}
+
+
+def _top_bucket_payload(by_key: dict[str, int] | None, total_seconds: int) -> dict[str, object]:
     if not by_key:
-        return {
-            "app": "",
-            "seconds": 0,
-            "human": _seconds_to_human(0),
-            "percentage": 0.0,
-        }
+        return dict(_EMPTY_TOP_BUCKET)
 
     app_label, seconds = max(by_key.items(), key=lambda item: (item[1], item[0].casefold()))
     percentage = (seconds / total_seconds * 100.0) if total_seconds > 0 else 0.0
@@ -260,147 +403,244 @@ def _top_bucket_payload(by_key: dict[str, int], total_seconds: int) -> dict[str,
     }
 
 
+@dataclass(slots=True)
+class _GroupTotals:
+    by_group: defaultdict[str, int] = field(default_factory=lambda: defaultdict(int))
+    by_app: defaultdict[str, int] = field(default_factory=lambda: defaultdict(int))
+    by_category: defaultdict[str, int] = field(default_factory=lambda: defaultdict(int))
+    total_seconds: int = 0
+    active_seconds: int = 0
+    effective_seconds: int = 0
+    passive_seconds: int = 0
+    afk_seconds: int = 0
+    sleep_seconds: int = 0
+    unattributed_seconds: int = 0
+    # (inicio, fin, clase de estado, etiqueta para el top por hora/día) para el reparto horario.
+    classified: list[tuple[int, int, int, str]] = field(default_factory=list)
+
+
+def _add_to_totals(
+    totals: _GroupTotals,
+    app: str,
+    has_title: bool,
+    source: str,
+    span: int,
+    seconds: int,
+    category_map: dict[str, str],
+    group_by: str,
+) -> tuple[int, str]:
+    # span es la duración de una sola sesión (para la heurística de suspensión); seconds, lo que se suma.
+    totals.total_seconds += seconds
+
+    app_label, app_norm = _app_labels(app or "")
+    is_afk = app_norm in _AFK_LABELS
+    is_sleep = app_norm in _SLEEP_LABELS or (
+        app_norm in _KWIN_APPS and _looks_like_sleep_false_focus(app_norm, has_title, source, span)
+    )
+    is_passive = _is_passive_source(source)
+    if is_sleep:
+        app_for_stats, stats_norm = _SLEEP_APP_LABEL, _SLEEP_APP_NORM
+    else:
+        app_for_stats, stats_norm = app_label, app_norm
+
+    if is_sleep:
+        totals.sleep_seconds += seconds
+        status = _SLEEP
+    elif is_afk:
+        totals.afk_seconds += seconds
+        status = _AFK
+    else:
+        totals.active_seconds += seconds
+        if is_passive:
+            totals.passive_seconds += seconds
+            status = _PASSIVE
+        else:
+            totals.effective_seconds += seconds
+            status = _EFFECTIVE
+
+    is_unattributed = stats_norm in _UNATTRIBUTED_LABELS and not has_title
+    if is_unattributed:
+        totals.unattributed_seconds += seconds
+    else:
+        totals.by_app[app_for_stats] += seconds
+        category_label = _category_for_app(app_for_stats, stats_norm, category_map)
+        totals.by_category[category_label] += seconds
+        if group_by == "category":
+            totals.by_group[category_label] += seconds
+        else:
+            totals.by_group[app_for_stats] += seconds
+
+    top_label = "No identificado" if is_unattributed else (app_for_stats or "No identificado")
+    return status, top_label
+
+
+def _aggregate_groups(segments: list[SegmentRow], category_map: dict[str, str], group_by: str) -> _GroupTotals:
+    # Primero se suman los segundos por lo único que decide la clasificación (app, con título,
+    # source, sesión larga); cada combinación se clasifica y acumula una sola vez, igual que el
+    # ranking con las filas ya agrupadas por SQLite.
+    keys: list[tuple[str, int, str, bool]] = []
+    seconds_by_key: defaultdict[tuple[str, int, str, bool], int] = defaultdict(int)
+    for app, _, source, start_ts, end_ts, has_title in segments:
+        duration = end_ts - start_ts
+        key = (app, has_title, source, duration >= _SLEEP_FALSE_FOCUS_SECONDS)
+        seconds_by_key[key] += duration
+        keys.append(key)
+
+    totals = _GroupTotals()
+    classes: dict[tuple[str, int, str, bool], tuple[int, str]] = {}
+    for key, seconds in seconds_by_key.items():
+        app, has_title, source, long_span = key
+        span = _SLEEP_FALSE_FOCUS_SECONDS if long_span else 0
+        classes[key] = _add_to_totals(totals, app, has_title, source, span, seconds, category_map, group_by)
+    classified = totals.classified
+    for (_, _, _, start_ts, end_ts, _), key in zip(segments, keys):
+        status, top_label = classes[key]
+        classified.append((start_ts, end_ts, status, top_label))
+    return totals
+
+
+def _aggregate_session_totals(
+    rows: list[tuple[str, int, str, int, int]],
+    extra_segments: list[Segment],
+    category_map: dict[str, str],
+    group_by: str,
+) -> _GroupTotals:
+    # rows viene ya agrupado por SQLite (app, con título, source, sesión larga, segundos).
+    totals = _GroupTotals()
+    for app, has_title, source, long_span, seconds in rows:
+        span = _SLEEP_FALSE_FOCUS_SECONDS if long_span else 0
+        _add_to_totals(totals, app, bool(has_title), source, span, seconds, category_map, group_by)
+    for segment in extra_segments:
+        duration = segment.end_ts - segment.start_ts
+        _add_to_totals(
+            totals, segment.app, segment.has_title, segment.source, duration, duration, category_map, group_by
+        )
+    return totals
+
+
+@dataclass(slots=True)
+class _HourDayTotals:
+    # by_hour[estado][hora] y by_day[día local][estado], con días contados desde epoch.
+    by_hour: list[list[int]]
+    by_hour_top: list[defaultdict[str, int] | None]
+    by_day: dict[int, list[int]]
+    by_day_top: dict[int, defaultdict[str, int]]
+
+
+def _add_day_seconds(
+    totals: _HourDayTotals, local_day: int, status: int, top_label: str, seconds: int
+) -> None:
+    day_status = totals.by_day.get(local_day)
+    if day_status is None:
+        day_status = totals.by_day[local_day] = [0] * _STATUS_COUNT
+        totals.by_day_top[local_day] = defaultdict(int)
+    day_status[status] += seconds
+    totals.by_day_top[local_day][top_label] += seconds
+
+
+def _accumulate(classified: list[tuple[int, int, int, str]], tzinfo) -> _HourDayTotals:
+    # Reparto por hora y día local sólo con aritmética entera: un tramo suma una vez en la fila
+    # de su estado y el resto de series se obtiene después a partir de esas filas.
+    totals = _HourDayTotals(
+        by_hour=[[0] * 24 for _ in range(_STATUS_COUNT)],
+        # Sólo las horas con actividad reciben mapa; el resto usa la entrada vacía precalculada.
+        by_hour_top=[None] * 24,
+        by_day={},
+        by_day_top={},
+    )
+    by_hour_top = totals.by_hour_top
+    fixed_offset = _fixed_utc_offset(tzinfo)
+
+    for cur_ts, end_ts, status, top_label in classified:
+        hour_seconds = totals.by_hour[status]
+        offset = fixed_offset if fixed_offset is not None else _utc_offset_seconds(cur_ts, tzinfo)
+        local_ts = cur_ts + offset
+        if end_ts <= local_ts - local_ts % 3600 + 3600 - offset:
+            # Caso común: el segmento cabe en una sola hora local, sin bucle de tramos.
+            seconds = end_ts - cur_ts
+            if seconds <= 0:
+                continue
+            hour_idx = local_ts // 3600 % 24
+            hour_seconds[hour_idx] += seconds
+            hour_top = by_hour_top[hour_idx]
+            if hour_top is None:
+                hour_top = by_hour_top[hour_idx] = defaultdict(int)
+            hour_top[top_label] += seconds
+            _add_day_seconds(totals, local_ts // 86400, status, top_label, seconds)
+            continue
+
+        seg_day = -1
+        day_seconds = 0
+        while cur_ts < end_ts:
+            offset = fixed_offset if fixed_offset is not None else _utc_offset_seconds(cur_ts, tzinfo)
+            local_ts = cur_ts + offset
+            chunk_end = min(end_ts, local_ts - local_ts % 3600 + 3600 - offset)
+            chunk_seconds = chunk_end - cur_ts
+            hour_idx = local_ts // 3600 % 24
+
+            hour_seconds[hour_idx] += chunk_seconds
+            hour_top = by_hour_top[hour_idx]
+            if hour_top is None:
+                hour_top = by_hour_top[hour_idx] = defaultdict(int)
+            hour_top[top_label] += chunk_seconds
+
+            # Lo diario se acumula aquí y se vuelca una sola vez por segmento y día.
+            local_day = local_ts // 86400
+            if local_day != seg_day:
+                if day_seconds:
+                    _add_day_seconds(totals, seg_day, status, top_label, day_seconds)
+                seg_day = local_day
+                day_seconds = 0
+            day_seconds += chunk_seconds
+            cur_ts = chunk_end
+        if day_seconds:
+            _add_day_seconds(totals, seg_day, status, top_label, day_seconds)
+
+    return totals
+
+
 def _build_overview(
-    segments: list[Segment],
+    segments: list[SegmentRow],
     range_start: int,
     range_end: int,
     tzinfo,
     category_map: dict[str, str],
     group_by: str,
 ) -> dict[str, object]:
-    by_group: dict[str, int] = {}
-    by_app: dict[str, int] = {}
-    by_category: dict[str, int] = {}
-    by_hour = [0] * 24
-    by_hour_active = [0] * 24
-    by_hour_effective = [0] * 24
-    by_hour_passive = [0] * 24
-    by_hour_afk = [0] * 24
-    by_hour_sleep = [0] * 24
-    by_hour_top_map: list[dict[str, int]] = [dict() for _ in range(24)]
-    by_day: dict[str, int] = {}
-    by_day_status: dict[str, dict[str, int]] = {}
-    by_day_top_map: dict[str, dict[str, int]] = {}
-    total_seconds = 0
-    active_seconds = 0
-    effective_seconds = 0
-    passive_seconds = 0
-    afk_seconds = 0
-    sleep_seconds = 0
-    unattributed_seconds = 0
-
-    for segment in segments:
-        duration = segment.end_ts - segment.start_ts
-        total_seconds += duration
-
-        app_label = (segment.app or "").strip()
-        title = (segment.title or "").strip()
-        is_afk = _is_afk_label(app_label)
-        is_sleep = _is_sleep_label(app_label) or _looks_like_sleep_false_focus(
-            app_label=app_label,
-            title=title,
-            source=segment.source,
-            duration=duration,
-        )
-        is_passive = _is_passive_source(segment.source)
-        app_for_stats = "Suspensión/Hibernación" if is_sleep else app_label
-
-        if is_sleep:
-            sleep_seconds += duration
-        elif is_afk:
-            afk_seconds += duration
-        else:
-            active_seconds += duration
-            if is_passive:
-                passive_seconds += duration
-            else:
-                effective_seconds += duration
-
-        is_unattributed = app_for_stats.casefold() in {"proceso", "desconocido"} and not title
-        if is_unattributed:
-            unattributed_seconds += duration
-        else:
-            by_app[app_for_stats] = by_app.get(app_for_stats, 0) + duration
-            category_label = _category_for_app(app_for_stats, category_map)
-            by_category[category_label] = by_category.get(category_label, 0) + duration
-            if group_by == "category":
-                by_group[category_label] = by_group.get(category_label, 0) + duration
-            else:
-                by_group[app_for_stats] = by_group.get(app_for_stats, 0) + duration
-
-        cur_dt = datetime.fromtimestamp(segment.start_ts, tz=tzinfo)
-        end_dt = datetime.fromtimestamp(segment.end_ts, tz=tzinfo)
-        while cur_dt < end_dt:
-            next_hour = cur_dt.replace(minute=0, second=0, microsecond=0) + timedelta(hours=1)
-            next_day = cur_dt.replace(hour=0, minute=0, second=0, microsecond=0) + timedelta(days=1)
-            chunk_end = min(end_dt, next_hour, next_day)
-            chunk_seconds = int((chunk_end - cur_dt).total_seconds())
-            hour_idx = cur_dt.hour
-            day_key = cur_dt.date().isoformat()
-
-            by_hour[hour_idx] += chunk_seconds
-            day_status = by_day_status.setdefault(
-                day_key,
-                {
-                    "active": 0,
-                    "effective": 0,
-                    "passive": 0,
-                    "afk": 0,
-                    "sleep": 0,
-                },
-            )
-
-            if is_sleep:
-                by_hour_sleep[hour_idx] += chunk_seconds
-                day_status["sleep"] += chunk_seconds
-            elif is_afk:
-                by_hour_afk[hour_idx] += chunk_seconds
-                day_status["afk"] += chunk_seconds
-            else:
-                by_hour_active[hour_idx] += chunk_seconds
-                day_status["active"] += chunk_seconds
-                if is_passive:
-                    by_hour_passive[hour_idx] += chunk_seconds
-                    day_status["passive"] += chunk_seconds
-                else:
-                    by_hour_effective[hour_idx] += chunk_seconds
-                    day_status["effective"] += chunk_seconds
-
-            top_label = "No identificado" if is_unattributed else (app_for_stats or "No identificado")
-            hour_top = by_hour_top_map[hour_idx]
-            hour_top[top_label] = hour_top.get(top_label, 0) + chunk_seconds
-
-            day_top = by_day_top_map.setdefault(day_key, {})
-            day_top[top_label] = day_top.get(top_label, 0) + chunk_seconds
-
-            by_day[day_key] = by_day.get(day_key, 0) + chunk_seconds
-            cur_dt = chunk_end
+    totals = _aggregate_groups(segments, category_map, group_by)
+    buckets = _accumulate(totals.classified, tzinfo)
+    # Las filas del kernel van tal cual al payload: son listas de int que orjson serializa sin
+    # conversión (array/ndarray exigirían tolist() y su += por índice es más lento en CPython).
+    by_hour_effective, by_hour_passive, by_hour_afk, by_hour_sleep = buckets.by_hour
+    by_hour_active = list(map(add, by_hour_effective, by_hour_passive))
+    by_hour = list(map(sum, zip(*buckets.by_hour)))
 
     by_hour_top_app = [
-        _top_bucket_payload(by_hour_top_map[hour], by_hour[hour])
+        _top_bucket_payload(buckets.by_hour_top[hour], by_hour[hour])
         for hour in range(24)
     ]
 
     by_day_payload: list[dict[str, object]] = []
-    for day in sorted(by_day.keys()):
-        seconds = by_day.get(day, 0)
-        status = by_day_status.get(day, {})
-        top_app = _top_bucket_payload(by_day_top_map.get(day, {}), seconds)
+    for local_day in sorted(buckets.by_day):
+        effective, passive, afk, sleep = buckets.by_day[local_day]
+        active = effective + passive
+        seconds = active + afk + sleep
+        top_app = _top_bucket_payload(buckets.by_day_top[local_day], seconds)
         by_day_payload.append(
             {
-                "date": day,
+                "date": date_cls.fromordinal(_EPOCH_ORDINAL + local_day).isoformat(),
                 "seconds": seconds,
                 "human": _seconds_to_human(seconds),
-                "active_seconds": int(status.get("active", 0)),
-                "active_human": _seconds_to_human(int(status.get("active", 0))),
-                "effective_seconds": int(status.get("effective", 0)),
-                "effective_human": _seconds_to_human(int(status.get("effective", 0))),
-                "passive_seconds": int(status.get("passive", 0)),
-                "passive_human": _seconds_to_human(int(status.get("passive", 0))),
-                "afk_seconds": int(status.get("afk", 0)),
-                "afk_human": _seconds_to_human(int(status.get("afk", 0))),
-                "sleep_seconds": int(status.get("sleep", 0)),
-                "sleep_human": _seconds_to_human(int(status.get("sleep", 0))),
+                "active_seconds": active,
+                "active_human": _seconds_to_human(active),
+                "effective_seconds": effective,
+                "effective_human": _seconds_to_human(effective),
+                "passive_seconds": passive,
+                "passive_human": _seconds_to_human(passive),
+                "afk_seconds": afk,
+                "afk_human": _seconds_to_human(afk),
+                "sleep_seconds": sleep,
+                "sleep_human": _seconds_to_human(sleep),
                 "top_app": top_app["app"],
                 "top_app_seconds": top_app["seconds"],
                 "top_app_human": top_app["human"],
@@ -408,7 +648,8 @@ def _build_overview(
             }
         )
 
-    top_payload = _sorted_payload(by_group, total_seconds)[:50]
+    total_seconds = totals.total_seconds
+    top_payload = _sorted_payload(totals.by_group, total_seconds, limit=_TOP_GROUPS_LIMIT)
 
     return {
         "range_start_ts": range_start,
@@ -416,23 +657,23 @@ def _build_overview(
         "group_by": group_by,
         "total_seconds": total_seconds,
         "total_human": _seconds_to_human(total_seconds),
-        "active_seconds": active_seconds,
-        "active_human": _seconds_to_human(active_seconds),
-        "effective_seconds": effective_seconds,
-        "effective_human": _seconds_to_human(effective_seconds),
-        "passive_seconds": passive_seconds,
-        "passive_human": _seconds_to_human(passive_seconds),
-        "afk_seconds": afk_seconds,
-        "afk_human": _seconds_to_human(afk_seconds),
-        "sleep_seconds": sleep_seconds,
-        "sleep_human": _seconds_to_human(sleep_seconds),
-        "unattributed_seconds": unattributed_seconds,
-        "unattributed_human": _seconds_to_human(unattributed_seconds),
-        "distinct_apps": len(by_app),
-        "distinct_categories": len(by_category),
+        "active_seconds": totals.active_seconds,
+        "active_human": _seconds_to_human(totals.active_seconds),
+        "effective_seconds": totals.effective_seconds,
+        "effective_human": _seconds_to_human(totals.effective_seconds),
+        "passive_seconds": totals.passive_seconds,
+        "passive_human": _seconds_to_human(totals.passive_seconds),
+        "afk_seconds": totals.afk_seconds,
+        "afk_human": _seconds_to_human(totals.afk_seconds),
+        "sleep_seconds": totals.sleep_seconds,
+        "sleep_human": _seconds_to_human(totals.sleep_seconds),
+        "unattributed_seconds": totals.unattributed_seconds,
+        "unattributed_human": _seconds_to_human(totals.unattributed_seconds),
+        "distinct_apps": len(totals.by_app),
+        "distinct_categories": len(totals.by_category),
         "top_apps": top_payload,
-        "by_app": _sorted_payload(by_app, total_seconds),
-        "by_category": _sorted_payload(by_category, total_seconds),
+        "by_app": _sorted_payload(totals.by_app, total_seconds),
+        "by_category": _sorted_payload(totals.by_category, total_seconds),
         "by_hour_seconds": by_hour,
         "by_hour_active_seconds": by_hour_active,
         "by_hour_effective_seconds": by_hour_effective,
@@ -444,18 +685,19 @@ def _build_overview(
     }
 
 
-def _segment_to_item(segment: Segment, tzinfo) -> dict[str, object]:
-    duration = max(0, segment.end_ts - segment.start_ts)
+def _segment_to_item(segment: SegmentRow, format_iso: Callable[[int], str]) -> dict[str, object]:
+    app, title, source, start_ts, end_ts, _ = segment
+    duration = max(0, end_ts - start_ts)
     return {
-        "start_ts": segment.start_ts,
-        "end_ts": segment.end_ts,
-        "start_iso": datetime.fromtimestamp(segment.start_ts, tz=tzinfo).isoformat(),
-        "end_iso": datetime.fromtimestamp(segment.end_ts, tz=tzinfo).isoformat(),
+        "start_ts": start_ts,
+        "end_ts": end_ts,
+        "start_iso": format_iso(start_ts),
+        "end_iso": format_iso(end_ts),
         "duration_seconds": duration,
         "duration_human": _seconds_to_human(duration),
-        "app": segment.app,
-        "title": segment.title,
-        "source": segment.source,
+        "app": app,
+        "title": title,
+        "source": source,
     }
 
 
@@ -475,13 +717,21 @@ def create_app() -> FastAPI:
     interval_seconds = float(os.getenv("ACTIVIDAD_INTERVAL_SECONDS", "2"))
 
     idle_enabled = _parse_bool(os.getenv("ACTIVIDAD_IDLE_ENABLED"), True)
+    idle_evdev = _parse_bool(os.getenv("ACTIVIDAD_IDLE_EVDEV"), False)
     idle_threshold_seconds = int(os.getenv("ACTIVIDAD_IDLE_THRESHOLD_SECONDS", "60"))
     effective_idle_seconds = int(os.getenv("ACTIVIDAD_EFFECTIVE_IDLE_SECONDS", "8"))
     sleep_gap_seconds = int(os.getenv("ACTIVIDAD_SLEEP_GAP_SECONDS", "90"))
+    min_segment_seconds = max(0, int(os.getenv("ACTIVIDAD_MIN_SEGMENT_SECONDS", "0")))
 
     db = ActivityDB(db_path)
-    detector = WindowDetector()
-    idle_detector = IdleDetector(enabled=idle_enabled)
+    session_bus = SessionBus()
+    detector = WindowDetector(bus=session_bus)
+    idle_detector = IdleDetector(
+        enabled=idle_enabled,
+        input_monitor=idle_evdev,
+        refresh_interval_seconds=interval_seconds,
+        bus=session_bus,
+    )
     privacy_filter = PrivacyFilter(rules=[])
     tracker = ActivityTracker(
         db=db,
@@ -496,7 +746,7 @@ def create_app() -> FastAPI:
     )
 
     def refresh_privacy_rules() -> list[PrivacyRuleRow]:
-        rows = db.list_privacy_rules()
+        rows = db.list_privacy_rules(enabled_only=True)
         privacy_filter.update_rules(
             [
                 PrivacyRule(
@@ -512,53 +762,83 @@ def create_app() -> FastAPI:
         )
         return rows
 
-    def collect_segments(spec: RangeSpec) -> tuple[list[Segment], int]:
-        range_start = int(spec.start.timestamp())
-        range_end = int(spec.end.timestamp())
-
-        rows = db.overlapping_sessions(range_start, range_end)
-        segments: list[Segment] = []
-        for row in rows:
-            clipped = _clip_segment(row, range_start, range_end)
-            if clipped:
-                segments.append(clipped)
-
+    def live_segment(range_start: int, range_end: int) -> tuple[Segment | None, int]:
         tracker_status = tracker.status()
         now_ts = int(time.time())
         current = tracker_status.get("current")
-        if current and isinstance(current, dict) and (range_start <= now_ts < range_end):
-            current_app = str(current.get("app", "Desconocido"))
-            current_title = str(current.get("title", ""))
-            if not privacy_filter.is_excluded(app=current_app, title=current_title):
-                synthetic = SessionRow(
-                    id=-1,
-                    start_ts=int(current["start_ts"]),
-                    end_ts=now_ts,
-                    app=current_app,
-                    title=current_title,
-                    source=str(current.get("source", "")),
-                )
-                clipped = _clip_segment(synthetic, range_start, range_end)
-                if clipped:
-                    segments.append(clipped)
+        if not (current and isinstance(current, dict) and (range_start <= now_ts < range_end)):
+            return None, now_ts
+
+        current_app = str(current.get("app", "Desconocido"))
+        current_title = str(current.get("title", ""))
+        if privacy_filter.is_excluded(app=current_app, title=current_title):
+            return None, now_ts
+
+        synthetic = SessionRow(
+            id=-1,
+            start_ts=int(current["start_ts"]),
+            end_ts=now_ts,
+            app=current_app,
+            title=current_title,
+            source=str(current.get("source", "")),
+        )
+        clipped = _clip_segment(synthetic, range_start, range_end)
+        if clipped is None or clipped.end_ts - clipped.start_ts < min_segment_seconds:
+            return None, now_ts
+        return clipped, now_ts
+
+    def range_segments(range_start: int, range_end: int, live: Segment | None) -> list[SegmentRow]:
+        # SQLite recorta cada sesión al rango y sus tuplas ya tienen la forma de Segment: se usan tal cual.
+        segments: list[SegmentRow] = db.clipped_sessions(range_start, range_end, min_segment_seconds)
+
+        # overlapping_sessions ya devuelve las filas ordenadas por start_ts (y el recorte conserva
+        # ese orden): la sesión en curso se inserta en su sitio y nadie tiene que reordenar.
+        if live:
+            insort(segments, live, key=itemgetter(3))
+        return segments
+
+    def collect_segments(spec: RangeSpec) -> tuple[list[SegmentRow], int]:
+        range_start = int(spec.start.timestamp())
+        range_end = int(spec.end.timestamp())
+        live, now_ts = live_segment(range_start, range_end)
+        return range_segments(range_start, range_end, live), now_ts
+
+    @lru_cache(maxsize=32)
+    def stored_overview(range_start: int, range_end: int, tzinfo, group_by: str, revision: int) -> dict[str, object]:
+        # revision sólo forma parte de la clave: tras cualquier escritura en la base se recalcula.
+        return _build_overview(
+            range_segments(range_start, range_end, None),
+            range_start,
+            range_end,
+            tzinfo,
+            category_map=db.get_app_categories(),
+            group_by=group_by,
+        )
 
-        return segments, now_ts
+    @_ttl_cache(_HEALTH_CAPS_TTL_SECONDS)
+    def cached_capabilities() -> tuple[dict[str, object], dict[str, object]]:
+        # Los tableros consultan /api/health en bucle; las capacidades no cambian a ese ritmo.
+        return detector.capabilities(), idle_detector.capabilities()
 
     @asynccontextmanager
     async def lifespan(_: FastAPI):
         db.init()
         refresh_privacy_rules()
+        idle_detector.start()
         tracker.start()
         try:
             yield
         finally:
             tracker.stop()
+            idle_detector.stop()
+            db.close()
 
     app = FastAPI(
         title="Actividad Web",
         description="Monitor local de actividad tipo ActivityWatch, en español.",
         version="0.3.0",
         lifespan=lifespan,
+        default_response_class=ORJSONResponse,
     )
 
     app.state.db = db
@@ -576,8 +856,7 @@ def create_app() -> FastAPI:
 
     @app.get("/api/health")
     def health() -> dict[str, object]:
-        caps = detector.capabilities()
-        idle_caps = idle_detector.capabilities()
+        caps, idle_caps = cached_capabilities()
         tracker_status = tracker.status()
         privacy_rows = db.list_privacy_rules()
         privacy_stats = privacy_filter.stats()
@@ -676,28 +955,30 @@ def create_app() -> FastAPI:
         end_date: str | None = Query(default=None, description="Solo custom: YYYY-MM-DD (inclusive)"),
         date: str | None = Query(default=None, description="Compatibilidad legacy (equivale a anchor_date)"),
         group_by: str = Query(default="app", description="app | category"),
-    ) -> dict[str, object]:
+    ) -> Response:
         if date and not anchor_date:
             anchor_date = date
 
-        group_by_norm = (group_by or "app").strip().lower()
-        if group_by_norm not in {"app", "category"}:
-            raise HTTPException(status_code=400, detail="group_by debe ser app o category")
+        group_by_norm = _normalize_group_by(group_by)
 
         spec = _resolve_range(mode=mode, anchor_date_raw=anchor_date, start_date_raw=start_date, end_date_raw=end_date)
         range_start = int(spec.start.timestamp())
         range_end = int(spec.end.timestamp())
 
-        segments, now_ts = collect_segments(spec)
-        category_map = db.get_app_categories()
-        payload = _build_overview(
-            segments,
-            range_start,
-            range_end,
-            spec.start.tzinfo,
-            category_map=category_map,
-            group_by=group_by_norm,
-        )
+        live, now_ts = live_segment(range_start, range_end)
+        if live is None:
+            # Sin sesión en curso dentro del rango el resumen sólo depende de lo guardado: los sondeos
+            # del panel reutilizan el cálculo (copia superficial) hasta la siguiente escritura.
+            payload = dict(stored_overview(range_start, range_end, spec.start.tzinfo, group_by_norm, db.revision()))
+        else:
+            payload = _build_overview(
+                range_segments(range_start, range_end, live),
+                range_start,
+                range_end,
+                spec.start.tzinfo,
+                category_map=db.get_app_categories(),
+                group_by=group_by_norm,
+            )
         payload["mode"] = spec.mode
         payload["date"] = spec.start.date().isoformat()
         payload["anchor_date"] = spec.anchor_date.isoformat()
@@ -706,7 +987,9 @@ def create_app() -> FastAPI:
         payload["range_end_date_inclusive"] = (spec.end - timedelta(days=1)).date().isoformat()
         payload["days_count"] = max(1, (spec.end.date() - spec.start.date()).days)
         payload["updated_at_ts"] = now_ts
-        return payload
+        # Se devuelve la respuesta ya construida: FastAPI no valida ni recorre con jsonable_encoder
+        # un payload que sólo contiene str, int, float, listas y dicts, y orjson lo serializa directo.
+        return ORJSONResponse(payload)
 
     @app.get("/api/ranking")
     def ranking(
@@ -717,34 +1000,46 @@ def create_app() -> FastAPI:
         date: str | None = Query(default=None, description="Compatibilidad legacy (equivale a anchor_date)"),
         group_by: str = Query(default="app", description="app | category"),
         limit: int = Query(default=20, ge=1, le=100),
-    ) -> dict[str, object]:
-        base = overview(
-            mode=mode,
-            anchor_date=anchor_date,
-            start_date=start_date,
-            end_date=end_date,
-            date=date,
-            group_by=group_by,
+    ) -> Response:
+        if date and not anchor_date:
+            anchor_date = date
+
+        group_by_norm = _normalize_group_by(group_by)
+        spec = _resolve_range(mode=mode, anchor_date_raw=anchor_date, start_date_raw=start_date, end_date_raw=end_date)
+        range_start = int(spec.start.timestamp())
+        range_end = int(spec.end.timestamp())
+        # El ranking sólo necesita totales por grupo: SQLite suma las sesiones recortadas al rango
+        # y a Python sólo llegan unas pocas filas agregadas, sin reparto por hora ni día.
+        rows = db.overlapping_session_totals(
+            range_start,
+            range_end,
+            long_span_seconds=_SLEEP_FALSE_FOCUS_SECONDS,
+            min_duration=min_segment_seconds,
+        )
+        live, now_ts = live_segment(range_start, range_end)
+        totals = _aggregate_session_totals(rows, [live] if live else [], db.get_app_categories(), group_by_norm)
+        items = _sorted_payload(totals.by_group, totals.total_seconds, limit=min(limit, _TOP_GROUPS_LIMIT))
+        return ORJSONResponse(
+            {
+                "mode": spec.mode,
+                "group_by": group_by_norm,
+                "range_start_date": spec.start.date().isoformat(),
+                "range_end_date_inclusive": (spec.end - timedelta(days=1)).date().isoformat(),
+                "total_human": _seconds_to_human(totals.total_seconds),
+                "active_human": _seconds_to_human(totals.active_seconds),
+                "effective_human": _seconds_to_human(totals.effective_seconds),
+                "passive_human": _seconds_to_human(totals.passive_seconds),
+                "afk_human": _seconds_to_human(totals.afk_seconds),
+                "sleep_human": _seconds_to_human(totals.sleep_seconds),
+                "unattributed_human": _seconds_to_human(totals.unattributed_seconds),
+                "items": items,
+                "count": len(items),
+                "updated_at_ts": now_ts,
+            }
         )
-        return {
-            "mode": base["mode"],
-            "group_by": base["group_by"],
-            "range_start_date": base["range_start_date"],
-            "range_end_date_inclusive": base["range_end_date_inclusive"],
-            "total_human": base["total_human"],
-            "active_human": base.get("active_human", base["total_human"]),
-            "effective_human": base.get("effective_human", base.get("active_human", base["total_human"])),
-            "passive_human": base.get("passive_human", "0s"),
-            "afk_human": base.get("afk_human", "0s"),
-            "sleep_human": base.get("sleep_human", "0s"),
-            "unattributed_human": base["unattributed_human"],
-            "items": base["top_apps"][:limit],
-            "count": min(limit, len(base["top_apps"])),
-            "updated_at_ts": base["updated_at_ts"],
-        }
 
     @app.get("/api/recent")
-    def recent(limit: int = Query(default=50, ge=1, le=500)) -> dict[str, object]:
+    def recent(limit: int = Query(default=50, ge=1, le=500)) -> Response:
         rows = db.recent_sessions(limit=limit)
         items: list[dict[str, object]] = []
         for row in rows:
@@ -754,8 +1049,8 @@ def create_app() -> FastAPI:
                     "id": row.id,
                     "start_ts": row.start_ts,
                     "end_ts": row.end_ts,
-                    "start_iso": datetime.fromtimestamp(row.start_ts).astimezone().isoformat(),
-                    "end_iso": datetime.fromtimestamp(row.end_ts).astimezone().isoformat(),
+                    "start_iso": _local_iso(row.start_ts),
+                    "end_iso": _local_iso(row.end_ts),
                     "duration_seconds": duration,
                     "duration_human": _seconds_to_human(duration),
                     "app": row.app,
@@ -764,24 +1059,26 @@ def create_app() -> FastAPI:
                 }
             )
 
-        return {
-            "items": items,
-            "count": len(items),
-        }
+        return ORJSONResponse({"items": items, "count": len(items)})
 
     @app.get("/api/windows")
-    def windows(limit: int = Query(default=200, ge=1, le=2000)) -> dict[str, object]:
-        active = detector.detect()
+    def windows(limit: int = Query(default=200, ge=1, le=2000)) -> Response:
+        # El tracker ya detecta la ventana activa en cada ciclo: se reutiliza si es reciente.
+        snapshot = tracker.last_detection()
+        if snapshot is not None and snapshot[1] <= 2 * tracker.interval_seconds:
+            active = snapshot[0]
+        else:
+            active = detector.detect()
         open_windows = detector.list_windows(limit=limit)
 
-        by_app: dict[str, int] = {}
+        by_app: Counter[str] = Counter()
         items: list[dict[str, object]] = []
         for win in open_windows:
             is_private = privacy_filter.is_excluded(app=win.app, title=win.title)
             app_name = "Privado" if is_private else win.app
             title = "Oculto por regla de privacidad" if is_private else win.title
             source = "privacy" if is_private else win.source
-            by_app[app_name] = by_app.get(app_name, 0) + 1
+            by_app[app_name] += 1
             items.append(
                 {
                     "app": app_name,
@@ -795,7 +1092,7 @@ def create_app() -> FastAPI:
 
         app_counts = [
             {"app": app_name, "windows": count}
-            for app_name, count in sorted(by_app.items(), key=lambda item: item[1], reverse=True)
+            for app_name, count in sorted(by_app.items(), key=itemgetter(1), reverse=True)
         ]
 
         active_payload: dict[str, object] | None = None
@@ -810,13 +1107,15 @@ def create_app() -> FastAPI:
                 "private": active_private,
             }
 
-        return {
-            "count": len(items),
-            "distinct_apps": len(by_app),
-            "app_counts": app_counts,
-            "items": items,
-            "active": active_payload,
-        }
+        return ORJSONResponse(
+            {
+                "count": len(items),
+                "distinct_apps": len(by_app),
+                "app_counts": app_counts,
+                "items": items,
+                "active": active_payload,
+            }
+        )
 
     @app.get("/api/categories")
     def categories() -> dict[str, object]:
@@ -896,10 +1195,11 @@ def create_app() -> FastAPI:
 
         spec = _resolve_range(mode=mode, anchor_date_raw=anchor_date, start_date_raw=start_date, end_date_raw=end_date)
         segments, now_ts = collect_segments(spec)
-        items = [_segment_to_item(segment, tzinfo=spec.start.tzinfo) for segment in sorted(segments, key=lambda x: x.start_ts)]
+        format_iso = _iso_formatter(spec.start.tzinfo)
 
         if fmt == "json":
-            return JSONResponse(
+            items = [_segment_to_item(segment, format_iso) for segment in segments]
+            return ORJSONResponse(
                 {
                     "mode": spec.mode,
                     "range_start_date": spec.start.date().isoformat(),
@@ -910,78 +1210,96 @@ def create_app() -> FastAPI:
                 }
             )
 
-        output = io.StringIO()
-        writer = csv.DictWriter(
-            output,
-            fieldnames=[
-                "start_iso",
-                "end_iso",
-                "duration_seconds",
-                "duration_human",
-                "app",
-                "title",
-                "source",
-            ],
-        )
-        writer.writeheader()
-        for item in items:
-            writer.writerow(
-                {
-                    "start_iso": item["start_iso"],
-                    "end_iso": item["end_iso"],
-                    "duration_seconds": item["duration_seconds"],
-                    "duration_human": item["duration_human"],
-                    "app": item["app"],
-                    "title": item["title"],
-                    "source": item["source"],
-                }
-            )
+        def csv_chunks() -> Iterator[str]:
+            # Se envía por bloques: ni el CSV completo ni la lista de items llegan a estar en memoria.
+            output = io.StringIO()
+            writer = csv.writer(output)
+            writer.writerow(_CSV_EXPORT_FIELDS)
+            for index, segment in enumerate(segments, start=1):
+                item = _segment_to_item(segment, format_iso)
+                writer.writerow([item[key] for key in _CSV_EXPORT_FIELDS])
+                if index % _CSV_FLUSH_ROWS == 0:
+                    yield output.getvalue()
+                    output.seek(0)
+                    output.truncate()
+            yield output.getvalue()
 
         filename = f"actividad-{spec.mode}-{spec.start.date().isoformat()}.csv"
-        return Response(
-            content=output.getvalue(),
+        return StreamingResponse(
+            csv_chunks(),
             media_type="text/csv; charset=utf-8",
             headers={"Content-Disposition": f'attachment; filename="{filename}"'},
         )
 
     @app.get("/api/backup/export")
     def export_backup() -> Response:
-        rows = db.all_sessions()
         category_map = db.get_app_categories()
         privacy_rows = db.list_privacy_rules()
 
-        sessions_payload = [
-            {
-                "start_ts": row.start_ts,
-                "end_ts": row.end_ts,
-                "app": row.app,
-                "title": row.title,
-                "source": row.source,
-            }
-            for row in rows
-        ]
         categories_payload = [
             {"app": app_name, "category": category}
             for app_name, category in sorted(category_map.items(), key=lambda item: item[0].casefold())
         ]
         privacy_payload = [_privacy_row_payload(row) for row in privacy_rows]
-
         now_ts = int(time.time())
-        payload = {
-            "schema_version": 1,
-            "exported_at_ts": now_ts,
-            "sessions": sessions_payload,
-            "categories": categories_payload,
-            "privacy_rules": privacy_payload,
-        }
+
+        def backup_chunks() -> Iterator[bytes]:
+            # Las sesiones se leen por páginas y cada fila se serializa con orjson a bytes:
+            # nunca existe la lista completa de sesiones ni el documento entero en memoria.
+            yield b'{"schema_version":1,"exported_at_ts":%d,"sessions":[' % now_ts
+            batch: list[bytes] = []
+            separator = b""
+            for row in db.iter_all_sessions(batch_size=_BACKUP_BATCH_ROWS):
+                batch.append(
+                    orjson.dumps(
+                        {
+                            "start_ts": row.start_ts,
+                            "end_ts": row.end_ts,
+                            "app": row.app,
+                            "title": row.title,
+                            "source": row.source,
+                        }
+                    )
+                )
+                if len(batch) >= _BACKUP_BATCH_ROWS:
+                    yield separator + b",".join(batch)
+                    batch.clear()
+                    separator = b","
+            if batch:
+                yield separator + b",".join(batch)
+            yield b'],"categories":%b,"privacy_rules":%b}' % (
+                orjson.dumps(categories_payload),
+                orjson.dumps(privacy_payload),
+            )
+
         filename = datetime.now().strftime("actividad-backup-%Y%m%d-%H%M%S.json")
-        return JSONResponse(
-            payload,
+        return StreamingResponse(
+            backup_chunks(),
+            media_type="application/json",
             headers={"Content-Disposition": f'attachment; filename="{filename}"'},
         )
 
-    @app.post("/api/backup/restore")
-    def restore_backup(payload: BackupRestoreRequest, replace: bool = Query(default=False)) -> dict[str, object]:
+    @app.post(
+        "/api/backup/restore",
+        openapi_extra={
+            "requestBody": {
+                "required": True,
+                "content": {"application/json": {"schema": _inline_schema(BackupRestoreRequest)}},
+            }
+        },
+    )
+    async def restore_backup(request: Request, replace: bool = Query(default=False)) -> dict[str, object]:
+        # Un respaldo puede traer decenas de miles de sesiones: pydantic-core valida directamente
+        # desde los bytes, sin pasar antes por json.loads y un dict intermedio.
+        body = await request.body()
+        try:
+            payload = BackupRestoreRequest.model_validate_json(body)
+        except ValidationError as exc:
+            errors = [{**error, "loc": ("body", *error["loc"])} for error in exc.errors(include_url=False)]
+            raise RequestValidationError(errors) from exc
+        return await run_in_threadpool(apply_restore, payload, replace)
+
+    def apply_restore(payload: BackupRestoreRequest, replace: bool) -> dict[str, object]:
         was_paused = bool(tracker.status().get("paused"))
         tracker.set_paused(True)
 
@@ -996,27 +1314,19 @@ def create_app() -> FastAPI:
                 db.clear_app_categories()
                 db.clear_privacy_rules()
 
-            session_rows: list[tuple[int, int, str, str, str]] = []
-            for item in payload.sessions:
-                if item.end_ts <= item.start_ts:
-                    continue
-                session_rows.append((item.start_ts, item.end_ts, item.app, item.title, item.source or "restore"))
-            inserted_sessions = db.bulk_insert_sessions(session_rows)
+            # Generador: las tuplas se crean bloque a bloque mientras se insertan, sin una lista completa.
+            inserted_sessions = db.bulk_insert_sessions(
+                (item.start_ts, item.end_ts, item.app, item.title, item.source or "restore")
+                for item in payload.sessions
+                if item.end_ts > item.start_ts
+            )
 
             category_rows = [(item.app, item.category) for item in payload.categories if item.app.strip()]
             saved_categories = db.bulk_set_app_categories(category_rows)
 
-            for rule in payload.privacy_rules:
-                try:
-                    db.upsert_privacy_rule(
-                        scope=rule.scope,
-                        match_mode=rule.match_mode,
-                        pattern=rule.pattern,
-                        enabled=rule.enabled,
-                    )
-                    saved_rules += 1
-                except ValueError:
-                    skipped_rules += 1
+            saved_rules, skipped_rules = db.bulk_upsert_privacy_rules(
+                [(rule.scope, rule.match_mode, rule.pattern, rule.enabled) for rule in payload.privacy_rules]
+            )
 
             refresh_privacy_rules()
         finally:
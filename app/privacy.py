@@ -3,6 +3,7 @@ from __future__ import annotations
 import re
 import threading
 from dataclasses import dataclass
+from functools import lru_cache
 
 
 @dataclass
@@ -15,6 +16,11 @@ class PrivacyRule:
     updated_ts: int
 
 
+@lru_cache(maxsize=512)
+def compile_pattern(pattern: str) -> re.Pattern[str]:
+    return re.compile(pattern, flags=re.IGNORECASE)
+
+
 @dataclass
 class _CompiledRule:
     rule: PrivacyRule
@@ -22,10 +28,54 @@ class _CompiledRule:
     regex: re.Pattern[str] | None
 
 
+@dataclass(frozen=True)
+class _ScopeMatcher:
+    """Todas las reglas activas de un ámbito (app o title) reducidas a pocas búsquedas."""
+
+    exact: frozenset[str]
+    contains: re.Pattern[str] | None
+    regexes: tuple[re.Pattern[str], ...]
+
+    def matches(self, value: str, value_case: str) -> bool:
+        if value_case in self.exact:
+            return True
+        if self.contains is not None and self.contains.search(value_case):
+            return True
+        return any(regex.search(value) for regex in self.regexes)
+
+
+def _combine_regexes(regexes: list[re.Pattern[str]]) -> tuple[re.Pattern[str], ...]:
+    # Sólo se unen regex sin grupos: al juntarlas en una alternativa los números de grupo se
+    # desplazan y las referencias (\1, (?P=...), (?(1)...)) apuntarían al grupo de otra regla.
+    combinable = [regex for regex in regexes if regex.groups == 0]
+    separate = [regex for regex in regexes if regex.groups > 0]
+    if len(combinable) > 1:
+        try:
+            combined = re.compile("|".join(f"(?:{regex.pattern})" for regex in combinable), flags=re.IGNORECASE)
+        except re.error:
+            # Flags en línea o nombres de grupo repetidos: se mantienen por separado.
+            pass
+        else:
+            combinable = [combined]
+    return tuple(combinable + separate)
+
+
+def _build_scope_matcher(rules: list[_CompiledRule]) -> _ScopeMatcher | None:
+    if not rules:
+        return None
+    exact = frozenset(item.normalized_pattern for item in rules if item.rule.match_mode == "exact")
+    contains_patterns = sorted({item.normalized_pattern for item in rules if item.rule.match_mode == "contains"})
+    contains = re.compile("|".join(map(re.escape, contains_patterns))) if contains_patterns else None
+    regexes = _combine_regexes([item.regex for item in rules if item.regex is not None])
+    return _ScopeMatcher(exact=exact, contains=contains, regexes=regexes)
+
+
 class PrivacyFilter:
     def __init__(self, rules: list[PrivacyRule] | None = None) -> None:
         self._lock = threading.Lock()
         self._compiled_rules: list[_CompiledRule] = []
+        # (matcher de app, matcher de title); se sustituye entero para leerlo sin lock.
+        self._matchers: tuple[_ScopeMatcher | None, _ScopeMatcher | None] = (None, None)
         self.update_rules(rules or [])
 
     def update_rules(self, rules: list[PrivacyRule]) -> None:
@@ -40,7 +90,7 @@ class PrivacyFilter:
             regex_obj: re.Pattern[str] | None = None
             if rule.match_mode == "regex":
                 try:
-                    regex_obj = re.compile(pattern, flags=re.IGNORECASE)
+                    regex_obj = compile_pattern(pattern)
                 except re.error:
                     # Regex inválida: la ignoramos para no romper el tracker.
                     continue
@@ -53,8 +103,13 @@ class PrivacyFilter:
                 )
             )
 
+        matchers = (
+            _build_scope_matcher([item for item in compiled if item.rule.scope != "title"]),
+            _build_scope_matcher([item for item in compiled if item.rule.scope == "title"]),
+        )
         with self._lock:
             self._compiled_rules = compiled
+            self._matchers = matchers
 
     def match_reason(self, app: str, title: str) -> PrivacyRule | None:
         app_text = (app or "").strip()
@@ -89,7 +144,18 @@ class PrivacyFilter:
         return None
 
     def is_excluded(self, app: str, title: str) -> bool:
-        return self.match_reason(app=app, title=title) is not None
+        # Ruta caliente (tracker y /api/windows): una búsqueda por tipo de regla en vez de recorrer
+        # todas; match_reason sigue disponible cuando hace falta saber qué regla coincidió.
+        app_matcher, title_matcher = self._matchers
+        if app_matcher is not None:
+            app_text = (app or "").strip()
+            if app_text and app_matcher.matches(app_text, app_text.casefold()):
+                return True
+        if title_matcher is not None:
+            title_text = (title or "").strip()
+            if title_text and title_matcher.matches(title_text, title_text.casefold()):
+                return True
+        return False
 
     def stats(self) -> dict[str, int]:
         with self._lock:
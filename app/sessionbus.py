@@ -0,0 +1,104 @@
+from __future__ import annotations
+
+import os
+import threading
+import time
+
+try:
+    from jeepney import DBusAddress, MessageType, new_method_call
+    from jeepney.io.blocking import open_dbus_connection
+except ImportError:  # pragma: no cover - jeepney es opcional
+    DBusAddress = None  # type: ignore[assignment]
+    MessageType = None  # type: ignore[assignment]
+    new_method_call = None  # type: ignore[assignment]
+    open_dbus_connection = None  # type: ignore[assignment]
+
+_RESOLVE_RETRY_SECONDS = 30.0
+
+
+def session_bus_address() -> str:
+    address = os.getenv("DBUS_SESSION_BUS_ADDRESS", "").strip()
+    if address:
+        return address
+    runtime_dir = os.getenv("XDG_RUNTIME_DIR") or f"/run/user/{os.getuid()}"
+    bus_path = f"{runtime_dir}/bus"
+    if os.path.exists(bus_path):
+        return f"unix:path={bus_path}"
+    return ""
+
+
+class SessionBus:
+    """Conexión persistente al bus de sesión vía jeepney (sin lanzar gdbus)."""
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self._connection = None
+        # La dirección del bus casi nunca cambia: se resuelve una vez y sólo se reintenta
+        # (como mucho cada _RESOLVE_RETRY_SECONDS) si no existía o la conexión falló.
+        self._address = session_bus_address()
+        self._resolved_at = time.monotonic()
+
+    @property
+    def available(self) -> bool:
+        return open_dbus_connection is not None and bool(self._bus_address())
+
+    def _bus_address(self) -> str:
+        if not self._address and (time.monotonic() - self._resolved_at) >= _RESOLVE_RETRY_SECONDS:
+            self._address = session_bus_address()
+            self._resolved_at = time.monotonic()
+        return self._address
+
+    def call(
+        self,
+        destination: str,
+        object_path: str,
+        interface: str,
+        method: str,
+        signature: str | None = None,
+        body: tuple = (),
+        timeout: float = 1.0,
+    ) -> tuple | None:
+        if not self.available:
+            return None
+
+        address = DBusAddress(object_path, bus_name=destination, interface=interface)
+        message = new_method_call(address, method, signature, body)
+        with self._lock:
+            try:
+                if self._connection is None:
+                    self._connection = open_dbus_connection(bus=self._address)
+                reply = self._connection.send_and_get_reply(message, timeout=timeout)
+            except Exception:
+                # Conexión rota o bus reiniciado: se vuelve a resolver y se reabre en la siguiente llamada.
+                self._close_locked()
+                self._address = session_bus_address()
+                self._resolved_at = time.monotonic()
+                return None
+
+        if reply.header.message_type is not MessageType.method_return:
+            return None
+        return reply.body
+
+    def name_has_owner(self, name: str, timeout: float = 1.0) -> bool:
+        reply = self.call(
+            "org.freedesktop.DBus",
+            "/org/freedesktop/DBus",
+            "org.freedesktop.DBus",
+            "NameHasOwner",
+            "s",
+            (name,),
+            timeout=timeout,
+        )
+        return bool(reply and reply[0])
+
+    def close(self) -> None:
+        with self._lock:
+            self._close_locked()
+
+    def _close_locked(self) -> None:
+        if self._connection is not None:
+            try:
+                self._connection.close()
+            except Exception:
+                pass
+            self._connection = None
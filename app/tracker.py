@@ -1,5 +1,6 @@
 from __future__ import annotations
 
+import sqlite3
 import threading
 import time
 from dataclasses import dataclass
@@ -30,6 +31,7 @@ class ActivityTracker:
         effective_idle_seconds: int = 8,
         sleep_gap_seconds: int = 90,
         privacy_filter: PrivacyFilter | None = None,
+        checkpoint_interval_seconds: float = 60.0,
     ) -> None:
         self.db = db
         self.detector = detector
@@ -40,6 +42,7 @@ class ActivityTracker:
         self.effective_idle_seconds = max(1, int(effective_idle_seconds))
         self.sleep_gap_seconds = max(15, int(sleep_gap_seconds))
         self.privacy_filter = privacy_filter
+        self.checkpoint_interval_seconds = max(5.0, float(checkpoint_interval_seconds))
 
         self._thread: threading.Thread | None = None
         self._stop_event = threading.Event()
@@ -52,6 +55,10 @@ class ActivityTracker:
         self._sleep_segments = 0
         self._last_wall_ts: float | None = None
         self._last_mono_ts: float | None = None
+        self._last_checkpoint_mono = 0.0
+        # (instante monotónico, ventana detectada) del último ciclo; se reemplaza con una sola
+        # asignación para que la API lo lea sin tomar el lock.
+        self._last_detection: tuple[float, ActiveWindow | None] | None = None
 
     def start(self) -> None:
         if self._thread and self._thread.is_alive():
@@ -60,6 +67,7 @@ class ActivityTracker:
         self._stop_event.clear()
         self._last_wall_ts = time.time()
         self._last_mono_ts = time.monotonic()
+        self._last_checkpoint_mono = self._last_mono_ts
         self._thread = threading.Thread(target=self._run, name="activity-tracker", daemon=True)
         self._thread.start()
 
@@ -108,12 +116,21 @@ class ActivityTracker:
                 },
             }
 
+    def last_detection(self) -> tuple[ActiveWindow | None, float] | None:
+        """Última ventana detectada por el bucle y su antigüedad en segundos."""
+        snapshot = self._last_detection
+        if snapshot is None:
+            return None
+        detected_at, detected = snapshot
+        return detected, time.monotonic() - detected_at
+
     def _run(self) -> None:
         while not self._stop_event.is_set():
             now_wall = time.time()
             now_mono = time.monotonic()
             now_ts = int(now_wall)
             detected = self.detector.detect()
+            self._last_detection = (time.monotonic(), detected)
             idle_seconds, idle_backend = self._detect_idle()
 
             sleep_gap_start, sleep_gap_end = self._compute_sleep_gap(now_wall, now_mono)
@@ -133,8 +150,18 @@ class ActivityTracker:
 
             self._last_wall_ts = now_wall
             self._last_mono_ts = now_mono
+            if now_mono - self._last_checkpoint_mono >= self.checkpoint_interval_seconds:
+                self._checkpoint()
+                self._last_checkpoint_mono = now_mono
             self._stop_event.wait(self.interval_seconds)
 
+    def _checkpoint(self) -> None:
+        try:
+            self.db.checkpoint()
+        except sqlite3.Error:
+            # Un checkpoint fallido no debe detener el tracker; se reintenta en el siguiente ciclo.
+            pass
+
     def _compute_sleep_gap(self, now_wall: float, now_mono: float) -> tuple[int | None, int | None]:
         if self._last_wall_ts is None or self._last_mono_ts is None:
             return (None, None)
@@ -69,6 +69,23 @@ def test_overview_and_export_endpoints(client_app, today_iso):
     assert "start_iso,end_iso,duration_seconds" in export_csv.text
 
 
+def test_overview_reflects_writes_after_cached_poll(client_app, today_iso):
+    client, app = client_app
+    params = {"mode": "day", "anchor_date": today_iso, "group_by": "category"}
+
+    first = client.get("/api/overview", params=params).json()
+    assert client.get("/api/overview", params=params).json()["total_seconds"] == first["total_seconds"]
+
+    now = int(time.time())
+    app.state.db.insert_session(now - 300, now - 240, "Kate", "notas", "x11")
+    second = client.get("/api/overview", params=params).json()
+    assert second["total_seconds"] == first["total_seconds"] + 60
+
+    app.state.db.set_app_category("Kate", "Edición")
+    third = client.get("/api/overview", params=params).json()
+    assert "Edición" in {item["app"] for item in third["top_apps"]}
+
+
 def test_privacy_rules_crud_and_backup_restore(client_app):
     client, app = client_app
 
@@ -132,3 +149,27 @@ def test_privacy_rule_hides_windows_payload(client_app):
     assert response.status_code == 200
     payload = response.json()
     assert "app_counts" in payload
+
+
+def test_privacy_rule_rejects_invalid_regex(client_app):
+    client, _app = client_app
+
+    response = client.post(
+        "/api/privacy/rules",
+        json={
+            "scope": "title",
+            "match_mode": "regex",
+            "pattern": "banco(",
+            "enabled": True,
+        },
+    )
+    assert response.status_code == 400
+    assert client.get("/api/privacy/rules").json()["count"] == 0
+
+
+def test_backup_restore_rejects_invalid_payload(client_app):
+    client, _app = client_app
+
+    response = client.post("/api/backup/restore", json={"sessions": [{"start_ts": "x", "end_ts": 10}]})
+    assert response.status_code == 422
+    assert response.json()["detail"][0]["loc"][:2] == ["body", "sessions"]
@@ -0,0 +1,168 @@
+from __future__ import annotations
+
+import sqlite3
+
+import pytest
+
+from app.db import ActivityDB
+
+
+def _make_db(tmp_path) -> ActivityDB:
+    db = ActivityDB(str(tmp_path / "actividad-db-test.db"))
+    db.init()
+    return db
+
+
+def test_bulk_insert_normalizes_labels_and_skips_empty_ranges(tmp_path):
+    db = _make_db(tmp_path)
+
+    inserted = db.bulk_insert_sessions(
+        [
+            (100, 160, "  Desconocido ", None, None),
+            (200, 200, "Firefox", "vacía", "x11"),
+            (300, 360, "\tFirefox ", "Docs", "x11"),
+            (400, 460, "   ", "Sin app", "x11"),
+            (500, 560, "\xa0Firefox\xa0", "Docs", "x11"),
+            (600, 660, "De\u017fconocido", "", "x11"),
+        ]
+    )
+
+    assert inserted == 5
+    rows = db.all_sessions()
+    assert [row.app for row in rows] == ["Proceso", "Firefox", "Proceso", "Firefox", "Proceso"]
+    assert rows[0].title == ""
+    assert rows[0].source == ""
+    db.close()
+
+
+def test_bulk_insert_rolls_back_on_failure(tmp_path):
+    db = _make_db(tmp_path)
+
+    def rows():
+        for index in range(25_000):
+            yield (index * 10, index * 10 + 5, "Firefox", "Docs", "x11")
+        raise RuntimeError("restauración interrumpida")
+
+    with pytest.raises(RuntimeError):
+        db.bulk_insert_sessions(rows())
+
+    assert db.all_sessions() == []
+    db.close()
+
+
+def test_legacy_app_labels_are_normalized_on_init(tmp_path):
+    path = tmp_path / "actividad-db-test.db"
+    with sqlite3.connect(path) as conn:
+        conn.execute(
+            "CREATE TABLE sessions (id INTEGER PRIMARY KEY AUTOINCREMENT, start_ts INTEGER NOT NULL, "
+            "end_ts INTEGER NOT NULL, app TEXT NOT NULL, title TEXT NOT NULL DEFAULT '', "
+            "source TEXT NOT NULL DEFAULT '')"
+        )
+        conn.executemany(
+            "INSERT INTO sessions (start_ts, end_ts, app) VALUES (?, ?, ?)",
+            [
+                (100, 160, "\tFirefox\n"),
+                (200, 260, "\xa0Firefox"),
+                (300, 360, "\u3000"),
+                (400, 460, "De\u017fconocido"),
+                (500, 560, "Kate"),
+            ],
+        )
+    conn.close()
+
+    db = _make_db(tmp_path)
+    assert [row.app for row in db.all_sessions()] == ["Firefox", "Firefox", "Proceso", "Proceso", "Kate"]
+    db.close()
+
+
+def test_recreated_database_file_uses_wal(tmp_path):
+    _make_db(tmp_path).close()
+    for suffix in ("", "-wal", "-shm"):
+        (tmp_path / f"actividad-db-test.db{suffix}").unlink(missing_ok=True)
+
+    db = _make_db(tmp_path)
+    with db._conn() as conn:
+        assert conn.execute("PRAGMA journal_mode").fetchone()[0] == "wal"
+    db.close()
+
+
+def test_recent_sessions_columns_matches_rows(tmp_path):
+    db = _make_db(tmp_path)
+    assert db.recent_sessions_columns()["start_ts"] == []
+
+    db.bulk_insert_sessions([(100, 160, "Firefox", "Docs", "x11"), (200, 230, "Kate", "notas", "x11")])
+
+    columns = db.recent_sessions_columns(limit=10)
+    rows = db.recent_sessions(limit=10)
+    assert columns["app"] == [row.app for row in rows]
+    assert sum(end - start for start, end in zip(columns["start_ts"], columns["end_ts"])) == 90
+    db.close()
+
+
+def test_overlapping_session_totals_clips_to_range(tmp_path):
+    db = _make_db(tmp_path)
+    db.bulk_insert_sessions(
+        [
+            (50, 150, "Firefox", "Docs", "x11"),
+            (150, 250, "Firefox", " ", "x11"),
+            (250, 2000, "KWin Wayland", "", "kdotool"),
+        ]
+    )
+
+    rows = db.overlapping_session_totals(100, 1500, long_span_seconds=900)
+    assert rows == [
+        ("Firefox", 1, "x11", 0, 50),
+        ("Firefox", 0, "x11", 0, 100),
+        ("KWin Wayland", 0, "kdotool", 1, 1250),
+    ]
+    db.close()
+
+
+def test_has_title_matches_python_strip(tmp_path):
+    db = _make_db(tmp_path)
+    db.bulk_insert_sessions(
+        [
+            (100, 160, "Firefox", "\u3000", "x11"),
+            (200, 260, "Firefox", "\xa0Docs\xa0", "x11"),
+        ]
+    )
+
+    rows = db.clipped_sessions(0, 1000)
+    assert [bool(row[5]) for row in rows] == [bool(row[1].strip()) for row in rows] == [False, True]
+    assert db.overlapping_session_totals(0, 1000) == [("Firefox", 0, "x11", 1, 60), ("Firefox", 1, "x11", 1, 60)]
+    db.close()
+
+
+def test_app_categories_cache_follows_writes(tmp_path):
+    db = _make_db(tmp_path)
+    db.set_app_category("Firefox", "Web")
+    assert db.get_app_categories() == {"Firefox": "Web"}
+
+    db.get_app_categories()["Firefox"] = "mutado"
+    db.bulk_set_app_categories([("Kate", "Edición")])
+    assert db.get_app_categories() == {"Firefox": "Web", "Kate": "Edición"}
+
+    db.delete_app_category("Firefox")
+    assert db.get_app_categories() == {"Kate": "Edición"}
+    db.clear_app_categories()
+    assert db.get_app_categories() == {}
+    db.close()
+
+
+def test_bulk_upsert_privacy_rules_skips_invalid_entries(tmp_path):
+    db = _make_db(tmp_path)
+    saved, skipped = db.bulk_upsert_privacy_rules(
+        [
+            ("title", "contains", "banco", True),
+            ("app", "regex", "(", True),
+            ("nope", "exact", "x", True),
+            ("title", "contains", "banco", False),
+        ]
+    )
+    assert (saved, skipped) == (2, 2)
+
+    rules = db.list_privacy_rules()
+    assert [(rule.scope, rule.match_mode, rule.pattern, rule.enabled) for rule in rules] == [
+        ("title", "contains", "banco", False)
+    ]
+    db.close()
@@ -0,0 +1,26 @@
+from __future__ import annotations
+
+import re
+
+import pytest
+
+from app.detector import WindowDetector
+
+
+@pytest.mark.parametrize(
+    "text",
+    [
+        'WM_CLASS(STRING) = "navigator", "firefox"',
+        'WM_CLASS(STRING) = "foo", ""',
+        'x = """a"',
+        'a"b"c"d',
+        'WM_CLASS(STRING) = " kate ", "org.kde.kate"',
+        "WM_CLASS:  not found.",
+        "",
+    ],
+)
+def test_extract_last_quoted_matches_previous_regex(text):
+    expected = ""
+    for match in re.finditer(r'"([^"]+)"', text):
+        expected = match.group(1)
+    assert WindowDetector()._extract_last_quoted(text) == expected.strip()
@@ -0,0 +1,127 @@
+from __future__ import annotations
+
+import os
+import time
+
+import pytest
+
+from app.idle import IdleDetector, IdleSample, _InputMonitor
+
+
+def _stub_detector(values: list[int | None], **kwargs) -> tuple[IdleDetector, list[int]]:
+    detector = IdleDetector(**kwargs)
+    calls: list[int] = []
+
+    def probe() -> int | None:
+        calls.append(1)
+        return values[min(len(calls), len(values)) - 1]
+
+    detector._backend_chain = (("stub", probe),)
+    return detector, calls
+
+
+def test_ttl_hit_reuses_sample_and_force_refresh_probes():
+    detector, calls = _stub_detector([3, 7])
+
+    assert detector.get_idle_seconds() == 3
+    assert detector.get_idle_seconds() == 3
+    assert len(calls) == 1
+
+    assert detector.get_idle_seconds(force_refresh=True) == 7
+    assert len(calls) == 2
+    assert detector.capabilities()["last_backend"] == "stub"
+
+
+def test_expired_sample_is_probed_again():
+    detector, calls = _stub_detector([4])
+    detector._last_sample = IdleSample(
+        seconds=4,
+        backend="stub",
+        available=True,
+        checked_ts=0,
+        checked_mono_ns=time.monotonic_ns() - 10_000_000_000,
+    )
+
+    assert detector.get_idle_seconds() == 4
+    assert len(calls) == 1
+
+
+def test_failed_probe_publishes_unavailable_sample():
+    detector, calls = _stub_detector([None])
+
+    assert detector.get_idle_seconds() is None
+    assert detector.get_idle_seconds() is None
+    assert len(calls) == 2
+    assert detector.capabilities()["last_backend"] == "none"
+
+
+def test_refresher_publishes_samples_and_stop_joins():
+    detector, calls = _stub_detector([12], refresh_interval_seconds=0.5)
+    detector.start()
+    try:
+        deadline = time.monotonic() + 2
+        while not calls and time.monotonic() < deadline:
+            time.sleep(0.01)
+        assert detector._refresher_running()
+        assert detector.get_idle_seconds() == 12
+        assert detector.capabilities()["last_idle_seconds"] == 12
+    finally:
+        detector.stop()
+
+    assert not detector._refresher_running()
+
+
+@pytest.mark.parametrize("enabled", [False, True])
+def test_disabled_or_without_backends_returns_none(enabled):
+    # Deshabilitado: no se sondea aunque haya backends. Habilitado sin backends: nada que sondear.
+    detector, calls = _stub_detector([5], enabled=enabled, refresh_interval_seconds=0.5)
+    if enabled:
+        detector._backend_chain = ()
+
+    detector.start()
+    assert not detector._refresher_running()
+    assert detector.get_idle_seconds() is None
+    assert detector.get_idle_seconds(force_refresh=True) is None
+    assert calls == []
+    detector.stop()
+
+
+@pytest.mark.parametrize(
+    ("strict_units", "raw", "expected"),
+    [
+        (True, 500, 0),
+        (True, 1500, 1),
+        (True, -20, 0),
+        (False, 500, 500),
+        (False, 1500, 1),
+    ],
+)
+def test_normalize_idle_value_units(strict_units, raw, expected):
+    detector = IdleDetector(enabled=False, strict_units=strict_units)
+    assert detector._normalize_idle_value(raw) == expected
+
+
+def test_input_monitor_opens_devices_on_start_and_survives_restart(monkeypatch):
+    read_fd, write_fd = os.pipe()
+    monkeypatch.setattr(_InputMonitor, "_device_paths", lambda self: [f"/proc/self/fd/{read_fd}"])
+    monitor = _InputMonitor()
+    try:
+        assert monitor.available
+        assert monitor._fds == []
+
+        for _ in range(2):
+            monitor.start()
+            assert monitor.running
+            os.write(write_fd, b"x")
+            deadline = time.monotonic() + 2
+            while monitor.idle_seconds() is None and time.monotonic() < deadline:
+                time.sleep(0.01)
+            assert monitor.idle_seconds() == 0
+            monitor.stop()
+            assert not monitor.running
+            assert monitor._fds == []
+            assert monitor.available
+    finally:
+        monitor.stop()
+        os.close(read_fd)
+        os.close(write_fd)
@@ -0,0 +1,24 @@
+from __future__ import annotations
+
+from app.privacy import PrivacyFilter, PrivacyRule
+
+
+def _rule(rule_id: int, pattern: str) -> PrivacyRule:
+    return PrivacyRule(id=rule_id, scope="title", match_mode="regex", pattern=pattern, enabled=True, updated_ts=0)
+
+
+def test_is_excluded_agrees_with_match_reason_for_grouped_regexes():
+    privacy = PrivacyFilter(
+        [
+            _rule(1, r"(x)?z"),
+            _rule(2, r"^(a)?(?(1)b|c)$"),
+            _rule(3, r"^(?P<w>q)(?P=w)$"),
+            _rule(4, r"^(m)\1$"),
+            _rule(5, r"banco|tarjeta"),
+        ]
+    )
+
+    for title in ["ab", "c", "qq", "mm", "mi banco", "z", "xz", "b", "qa", "mn", "nada"]:
+        reason = privacy.match_reason(app="Firefox", title=title)
+        assert privacy.is_excluded(app="Firefox", title=title) is (reason is not None), title
+    assert privacy.match_reason(app="Firefox", title="ab").id == 2